@@ -2,6 +2,60 @@ import argparse
 import re
 import os
 import shutil
+import gzip
+import json
+import sys
+import uuid
+import logging
+import errno
+import asyncio
+import select
+import struct
+import time
+
+# The functional tools library we import partial that will be useful for creating temporary functions.
+from functools import partial
+
+# The concurrent.futures module gives us thread and process pools with the same interface,
+# so we can swap between them without changing the rest of the code.
+from concurrent import futures
+
+# The fcntl module only exists on unix systems, and we only need it for reflinks, so it's fine if it's missing.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# We talk to inotify through ctypes, so we don't need anything that isn't part of Python.
+# If it isn't there, watch mode polls the directory instead.
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:
+    ctypes = None
+
+
+# We want a logger specifically for this tool, so lets grab one so that we can control it on its own.
+logger = logging.getLogger('cliRenamer')
+
+# These are the ways we know of to duplicate a file, from the most to the least familiar.
+LINK_MODES = ('copy', 'hardlink', 'reflink', 'auto')
+
+# This is the Linux ioctl request number that asks the filesystem to clone a file (Btrfs, XFS and friends).
+FICLONE = 0x40049409
+
+# These are the errors that network filesystems give back when they are only having a hard time,
+# so trying again a little later is likely to work. Not every system has ESTALE, so we look it up carefully.
+TRANSIENT_ERRORS = set(getattr(errno, name) for name in ('EAGAIN', 'EBUSY', 'EINTR', 'ETIMEDOUT', 'ESTALE')
+                       if hasattr(errno, name))
+
+# These are the inotify events we listen for. We wait for files to be closed after writing, rather than created,
+# so that we never rename a file that is still being written.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
 
 def main():
     """
@@ -14,9 +68,10 @@ def main():
     parser = argparse.ArgumentParser(description="This is a batch renamer",
                                      usage="To replace all files with hello with goodbye instead: python cliRenamer.py hello goodbye")
 
-    # We'll add two positional arguments. These must be given
-    parser.add_argument('inString', help="The word to replace")
-    parser.add_argument('outString', help="The word to replace it with")
+    # We'll add two positional arguments. These must be given, unless we are given a rules file instead.
+    # nargs='?' means they can be left out, in which case they'll be None.
+    parser.add_argument('inString', nargs='?', help="The word to replace")
+    parser.add_argument('outString', nargs='?', help="The word to replace it with")
 
     # Then we'll add some keyword arguments. Like in python functions, they default to a value so are optional
     # The first one is set to store_true, which means it is False by default but if provided will be set to True
@@ -27,16 +82,101 @@ def main():
     parser.add_argument('-r', '--regex',
                         help="Whether the patterns are regex or not",
                         action='store_true')
-    # This last argument doesn't say store true, which means a value must be given for it, or it will default to None.
+    # This argument doesn't say store true, which means a value must be given for it, or it will default to None.
     parser.add_argument('-o', '--out', help="The output location defaults to here")
+    parser.add_argument('-R', '--recursive',
+                        help="Whether to walk into sub directories as well",
+                        action='store_true')
+    # The type argument makes argparse convert the value for us, and error if it isn't a number.
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="How many files to copy or rename at the same time")
+    parser.add_argument('--processes',
+                        help="Use a pool of processes instead of threads for the jobs",
+                        action='store_true')
+    parser.add_argument('-c', '--concurrency', type=int,
+                        help="Run with asyncio, keeping this many operations in flight and retrying transient "
+                             "errors. Best for network filesystems where every call has to wait on the network")
+    parser.add_argument('-p', '--progress',
+                        help="Print the progress as files are processed",
+                        action='store_true')
+    parser.add_argument('-n', '--dry-run', dest='dryRun',
+                        help="Print what would be copied or renamed without touching any files",
+                        action='store_true')
+    # The choices argument makes argparse error if the value isn't one of the ones we know about.
+    parser.add_argument('--link-mode', dest='linkMode', choices=LINK_MODES, default='copy',
+                        help="How duplicates are made. auto picks the cheapest way that gives an independent copy")
+    parser.add_argument('-m', '--manifest',
+                        help="A file listing the paths to rename, one per line, instead of the directory listing. "
+                             "Use - to read it from stdin. It may be gzip compressed")
+    parser.add_argument('-0', '--null', dest='nullSeparated',
+                        help="The paths in the manifest are separated by NUL characters instead of new lines",
+                        action='store_true')
+    parser.add_argument('--journal',
+                        help="A file to record every completed copy or rename in, so the job can be resumed or undone")
+    parser.add_argument('--resume',
+                        help="Finish the job recorded in --journal, without listing any directories",
+                        action='store_true')
+    parser.add_argument('--rollback',
+                        help="Undo the job recorded in --journal, newest first",
+                        action='store_true')
+    parser.add_argument('-w', '--watch',
+                        help="Keep running, and rename new files as they arrive in the directory",
+                        action='store_true')
+    parser.add_argument('--poll',
+                        help="In watch mode, poll the directory instead of using inotify",
+                        action='store_true')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help="In watch mode, how many seconds to wait between polls")
+    parser.add_argument('--rules',
+                        help="A JSON file with a list of find and replace rules to apply in a single pass")
+    parser.add_argument('-v', '--verbose',
+                        help="Log every file as it is processed",
+                        action='store_true')
 
     # Finally we tell the parser to parse the arguments from the command line
     args = parser.parse_args()
+
+    # Resuming or rolling back only needs the journal, since it has the whole plan in it.
+    if (args.resume or args.rollback) and not args.journal:
+        parser.error("--resume and --rollback need the --journal of the job")
+
+    # Otherwise we need either something to replace, or a rules file that tells us what to replace.
+    if args.inString is None and not args.rules and not (args.resume or args.rollback):
+        parser.error("Either give inString and outString, or a --rules file")
+    if args.inString is not None and args.outString is None:
+        parser.error("outString is needed to replace %s with" % args.inString)
+
+    # We'll do a basic configuration of the loggers, and only show the per file logs if we were asked to.
+    logging.basicConfig()
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
     # We use these arguments to provide input to our rename function
-    rename(args.inString, args.outString, duplicate=args.duplicate, outDirectory=args.out, regex=args.regex)
+    if args.rollback:
+        rollbackJournal(args.journal)
+        return
+
+    if args.watch:
+        watch(args.inString, args.outString, duplicate=args.duplicate, outDirectory=args.out, regex=args.regex,
+              linkMode=args.linkMode, rules=loadRules(args.rules) if args.rules else None, poll=args.poll,
+              interval=args.interval)
+        return
 
+    if args.resume:
+        resumeJournal(args.journal, jobs=args.jobs, processes=args.processes,
+                      progress=printProgress if args.progress else None, linkMode=args.linkMode,
+                      concurrency=args.concurrency)
+        return
 
-def rename(inString, outString, duplicate=True, inDirectory=None, outDirectory=None, regex=False):
+    rename(args.inString, args.outString, duplicate=args.duplicate, outDirectory=args.out, regex=args.regex,
+           recursive=args.recursive, jobs=args.jobs, processes=args.processes,
+           progress=printProgress if args.progress else None, dryRun=args.dryRun, linkMode=args.linkMode,
+           manifest=args.manifest, separator='\0' if args.nullSeparated else '\n',
+           rules=loadRules(args.rules) if args.rules else None, journal=args.journal, concurrency=args.concurrency)
+
+
+def rename(inString, outString, duplicate=True, inDirectory=None, outDirectory=None, regex=False,
+           recursive=False, jobs=1, processes=False, progress=None, dryRun=False, linkMode='copy',
+           manifest=None, separator='\n', batchSize=10000, rules=None, journal=None, concurrency=None):
     """
        A simple function to rename all the given files in a given directory
        Args:
@@ -46,18 +186,43 @@ def rename(inString, outString, duplicate=True, inDirectory=None, outDirectory=N
            inDir: what the directory we should operate in
            outDir: the directory we should write to.
            regex: Whether we should use regex instead of simple string replace
+           recursive: Whether we should walk into sub directories. Only files are renamed in this mode,
+                      and the sub directory layout is mirrored inside the output directory.
+           jobs: How many files to copy or rename at the same time
+           processes: Whether the jobs should run in a pool of processes instead of threads
+           progress: An optional function that is called with (done, total) as files are processed
+           dryRun: Whether we should only print the plan instead of running it
+           linkMode: How duplicates are made, one of LINK_MODES. See duplicateFile.
+           manifest: An optional path to a file listing the paths to rename, or '-' for stdin.
+                     The directory is not listed at all in this mode. Relative paths are relative to inDir,
+                     and files stay in their own directory unless outDir is given.
+           separator: The character that separates the paths in the manifest
+           batchSize: How many manifest paths are planned and run at a time, which keeps memory use flat
+           rules: An optional list of rules to apply in a single pass, as given back by loadRules.
+                  If inString is also given, it is used as the first rule.
+           journal: An optional path to record the plan and every completed step in.
+                    See resumeJournal and rollbackJournal.
+           concurrency: If given, the files are processed with asyncio instead, keeping this many in flight
+                        and retrying transient errors. jobs and processes are ignored. See runOperationsAsync.
+       Returns:
+           int: The number of files that were copied or renamed
     """
 
     # If no input directory is provided, we'll use the current working directory that the script was called from.
     if not inDirectory:
         inDirectory = os.getcwd()
 
+    # A manifest lists files from all over the place, so without an output directory they each stay where they are.
+    manifestOutDirectory = os.path.abspath(outDirectory) if outDirectory else None
+
     # If not output directory is provided we'll use the same directory as the current working directory.
     if not outDirectory:
         outDirectory = inDirectory
 
     # It is possible that the output directory is provided in relative terms ("../../")
     # abspath will convert this to a real path.
+    # We do the same for the input directory so that the paths we plan with can be compared against each other.
+    inDirectory = os.path.abspath(inDirectory)
     outDirectory = os.path.abspath(outDirectory)
 
     # It is also possible that the output directory does not exist.
@@ -67,34 +232,1447 @@ def rename(inString, outString, duplicate=True, inDirectory=None, outDirectory=N
     if not os.path.exists(inDirectory):
         raise IOError("%s does not exist" % inDirectory)
 
-    # Finally we loop through all the files in the current directory
-    for f in os.listdir(inDirectory):
-        # We will start by skipping over files that start with a dot.
-        # This is a sign that they are hidden and should not be modified.
-        if f.startswith('.'):
-            continue
+    renamer = getRenamer(inString, outString, regex=regex, rules=rules)
+
+    if manifest is not None:
+        # If we're given a manifest, we stream the paths from it and never list the directory at all.
+        files = manifestFiles(readManifest(manifest, separator=separator), inDirectory, manifestOutDirectory)
+    else:
+        files = ((os.path.join(inDirectory, relDir), f, os.path.join(outDirectory, relDir))
+                 for relDir, f in walkFiles(inDirectory, recursive=recursive))
+
+    operations = iterOperations(files, renamer)
+
+    if manifest is not None:
+        # Since the manifest could be millions of lines long, we work through it a batch at a time.
+        batches = iterBatches(operations, batchSize)
+    else:
+        # Otherwise we work out every copy or rename up front, so that the walk is finished before we start changing
+        # the files we are walking over.
+        batches = [list(operations)]
+
+    # A dry run doesn't change anything, so there is nothing to record.
+    if journal and not dryRun:
+        journal = Journal(journal)
+    else:
+        journal = None
+
+    total = 0
+    try:
+        for batch in batches:
+            batchProgress = progress
+            if progress and manifest is not None:
+                # The progress we report is for the whole manifest rather than just this batch.
+                # We don't know how many files there are until we reach the end, so we give back None as the total.
+                def batchProgress(done, batchTotal, offset=total):
+                    progress(offset + done, None)
+
+            # With a manifest we never list a directory, not even the destinations, since one big directory would be
+            # listed again for every batch. Each destination is checked on its own instead.
+            total += runBatch(batch, duplicate=duplicate, jobs=jobs, processes=processes, progress=batchProgress,
+                              dryRun=dryRun, linkMode=linkMode, journal=journal, concurrency=concurrency,
+                              exists=os.path.lexists if manifest is not None else None)
+    finally:
+        # Even if something went wrong, we make sure everything that did happen is saved in the journal.
+        if journal:
+            journal.close()
+
+    if progress and manifest is not None and total:
+        progress(total, total)
+
+    return total
+
+
+def runBatch(operations, duplicate=True, jobs=1, processes=False, progress=None, dryRun=False, linkMode='copy',
+             journal=None, concurrency=None, exists=None):
+    """
+    Plans and then runs a list of copies or renames.
+    Args:
+        operations: A list of (src, dest) tuples
+        duplicate: Whether we should copy the files instead of renaming them
+        jobs: How many files to copy or rename at the same time
+        processes: Whether the jobs should run in a pool of processes instead of threads
+        progress: An optional function that is called with (done, total) as files are processed
+        dryRun: Whether we should only print the plan instead of running it
+        linkMode: How duplicates are made, one of LINK_MODES
+        journal: An optional Journal to record the plan and every completed chain in
+        concurrency: If given, run with asyncio keeping this many chains in flight. See runOperationsAsync.
+        exists: Passed on to planOperations
+
+    Returns:
+        int: The number of files that were copied or renamed
+    """
+    # Before we touch anything, we turn the operations into a plan.
+    # This will error if any file would be overwritten, so we never leave a job half done.
+    plan = planOperations(operations, duplicate=duplicate, exists=exists)
+
+    if dryRun:
+        printPlan(plan)
+        return sum(len(chain) for chain in plan)
+
+    # When we mirror sub directories into a different output directory, they may not exist yet.
+    # We make them here, one at a time, so the jobs below never race each other to create the same folder.
+    for destDir in set(os.path.dirname(dest) for src, dest in operations):
+        if not os.path.isdir(destDir):
+            os.makedirs(destDir)
+
+    # The plan is saved before anything runs, so that a job that dies part way through can be finished or undone.
+    chainDone = None
+    if journal:
+        chainIds = journal.addPlan(plan)
+        chainDone = lambda index: journal.markDone(chainIds[index])
+
+    return runOperations(plan, jobs=jobs, processes=processes, progress=progress, linkMode=linkMode,
+                         chainDone=chainDone, concurrency=concurrency)
+
+
+def watch(inString, outString, duplicate=True, inDirectory=None, outDirectory=None, regex=False, linkMode='copy',
+          rules=None, poll=False, interval=1.0, settle=0.25):
+    """
+    Keeps running, and renames new files as they arrive in a directory, until it is stopped with Ctrl+C.
+
+    Everything already in the directory is renamed first. After that, we keep an index of the names we've already
+    dealt with in memory, and only ever look at new ones. On Linux we use inotify to be told about new files,
+    so the time it takes to handle each file doesn't grow with the size of the directory.
+    Anywhere else, or if poll is True, we list the directory every interval seconds instead.
+    Files that arrive close together are handled together in one batch.
+
+    Args:
+        inString:  the input string to find and replace
+        outString: the output string to replace it with
+        duplicate: Whether we should duplicate the renamed files to prevent writing over the originals
+        inDirectory: The directory to watch
+        outDirectory: The directory we should write to
+        regex: Whether we should use regex instead of simple string replace
+        linkMode: How duplicates are made, one of LINK_MODES
+        rules: An optional list of rules to apply, as given back by loadRules
+        poll: Whether to poll the directory even if inotify is available
+        interval: How many seconds to wait between polls
+        settle: How many seconds to wait for more files once one has arrived, before handling them all together
+    """
+    inDirectory = os.path.abspath(inDirectory or os.getcwd())
+    outDirectory = os.path.abspath(outDirectory or inDirectory)
+
+    if not os.path.exists(outDirectory):
+        raise IOError("%s does not exist" % outDirectory)
+    if not os.path.exists(inDirectory):
+        raise IOError("%s does not exist" % inDirectory)
+
+    renamer = getRenamer(inString, outString, regex=regex, rules=rules)
+
+    # This is our index of every name we have already dealt with.
+    seen = set()
+
+    def handle(names):
+        # A set difference gives us just the new names in a single step.
+        names = set(name for name in names if not name.startswith('.')) - seen
+        if not names:
+            return
+        seen.update(names)
+
+        files = ((inDirectory, name, outDirectory) for name in names)
+        operations = list(iterOperations(files, renamer))
+
+        # Checking the handful of new destinations one at a time is much cheaper than listing the whole directory.
+        try:
+            runBatch(operations, duplicate=duplicate, linkMode=linkMode, exists=os.path.lexists)
+        except (IOError, OSError) as error:
+            # One bad batch shouldn't stop us from handling everything that arrives after it.
+            logger.error(error)
+            return
+
+        for src, dest in operations:
+            logger.info("%s -> %s", src, dest)
+            # The files we write are new arrivals too, so we add them to the index to make sure we never rename
+            # them a second time.
+            if outDirectory == inDirectory:
+                seen.add(os.path.basename(dest))
+            if not duplicate:
+                seen.discard(os.path.basename(src))
+
+    # We start listening before we deal with what's already there, so nothing can arrive in between unnoticed.
+    batches = None
+    if not poll:
+        batches = iterInotifyBatches(inDirectory, settle=settle)
+    if batches is None:
+        logger.debug("Polling %s every %ss", inDirectory, interval)
+        batches = iterPollBatches(inDirectory, interval=interval)
+
+    handle(entry.name for entry in os.scandir(inDirectory))
+
+    try:
+        for added, removed in batches:
+            # Names that go away can come back later as new files, so we take them out of the index.
+            seen.difference_update(removed)
+            handle(added)
+    except KeyboardInterrupt:
+        pass
+
+
+def iterInotifyBatches(directory, settle=0.25, maxWait=5.0):
+    """
+    Starts watching a directory with inotify.
+    Args:
+        directory: The directory to watch
+        settle: How many seconds to wait for more events once one has arrived
+        maxWait: The longest we'll keep collecting events before handing back a batch, if they never stop arriving
+
+    Returns:
+        generator: A generator that yields (added, removed) sets of names as files arrive and leave,
+                   or None if inotify isn't available here.
+    """
+    if not ctypes or not sys.platform.startswith('linux'):
+        return None
+
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    fd = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        return None
+
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+
+    # We've started watching now, rather than when the generator is first used, so the caller doesn't miss anything.
+    return readInotifyBatches(fd, directory, settle=settle, maxWait=maxWait)
+
+
+def readInotifyBatches(fd, directory, settle=0.25, maxWait=5.0):
+    """
+    A generator that reads inotify events and groups them into batches.
+    Args:
+        fd: The inotify file descriptor
+        directory: The directory being watched
+        settle: How many seconds to wait for more events once one has arrived
+        maxWait: The longest we'll keep collecting events before handing back a batch
+
+    Yields:
+        tuple: A set of names that arrived and a set of names that left
+    """
+    # Each event starts with a fixed size header, followed by the name padded out with NUL characters.
+    header = struct.Struct('iIII')
+
+    try:
+        while True:
+            added = set()
+            removed = set()
+            overflowed = False
+
+            # We wait as long as it takes for the first event, then only settle seconds for each one after that.
+            timeout = None
+            started = None
+            while select.select([fd], [], [], timeout)[0]:
+                data = os.read(fd, 1 << 16)
+                offset = 0
+                while offset < len(data):
+                    wd, eventMask, cookie, length = header.unpack_from(data, offset)
+                    offset += header.size
+                    name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                    offset += length
+
+                    if eventMask & IN_Q_OVERFLOW:
+                        overflowed = True
+                    elif eventMask & (IN_MOVED_FROM | IN_DELETE):
+                        added.discard(name)
+                        removed.add(name)
+                    elif name:
+                        removed.discard(name)
+                        added.add(name)
+
+                started = started or time.time()
+                timeout = settle
+                if time.time() - started > maxWait:
+                    break
+
+            # If events arrived faster than we could read them, the kernel drops them,
+            # so we list the directory once to catch up.
+            if overflowed:
+                logger.warning("Too many files arrived at once, listing %s to catch up", directory)
+                added.update(entry.name for entry in os.scandir(directory))
+
+            yield added, removed
+    finally:
+        os.close(fd)
 
-        # If we are told to use regex, then lets use the regex module to replace the string.
-        if regex:
-            name = re.sub(inString, outString, f)
-        else:
-            # Otherwise lets just use regular string replace.
-            name = f.replace(inString, outString)
+
+def iterPollBatches(directory, interval=1.0):
+    """
+    Starts watching a directory by listing it every so often.
+    Args:
+        directory: The directory to watch
+        interval: How many seconds to wait between each listing
+
+    Returns:
+        generator: A generator that yields (added, removed) sets of names that arrived and left since the last listing
+    """
+    # We take the first listing now, rather than when the generator is first used, so anything that arrives
+    # after this counts as new, even if it's before the caller starts asking for batches.
+    previous = set(entry.name for entry in os.scandir(directory))
+    return readPollBatches(directory, previous, interval=interval)
+
+
+def readPollBatches(directory, previous, interval=1.0):
+    """
+    A generator that lists a directory every so often, and gives back what changed.
+    Args:
+        directory: The directory to watch
+        previous: The set of names in the directory when we started watching
+        interval: How many seconds to wait between each listing
+
+    Yields:
+        tuple: A set of names that arrived and a set of names that left since the last listing
+    """
+    while True:
+        time.sleep(interval)
+        names = set(entry.name for entry in os.scandir(directory))
+        if names != previous:
+            yield names - previous, previous - names
+        previous = names
+
+
+def getRenamer(inString, outString, regex=False, rules=None):
+    """
+    Gives back a function that works out the new name of a file.
+    Args:
+        inString: the input string to find and replace
+        outString: the output string to replace it with
+        regex: Whether inString is a regex pattern or a simple string
+        rules: An optional list of rules. If inString is also given, it is used as the first rule.
+
+    Returns:
+        function: A function that takes a file name and gives back its new name
+    """
+    # When we have several rules, we compile them all together once so each name is only scanned once.
+    if rules:
+        rules = list(rules)
+        if inString:
+            rules.insert(0, {'find': inString, 'replace': outString, 'regex': regex})
+        return RuleSet(rules).apply
+
+    # partial gives us a version of getNewName with everything but the name already filled in.
+    return partial(getNewName, inString=inString, outString=outString, regex=regex)
+
+
+def iterOperations(files, renamer):
+    """
+    A generator that gives back the copies or renames to make for the given files.
+    Args:
+        files: An iterable of (directory, name, output directory) tuples
+        renamer: A function that takes a file name and gives back its new name
+
+    Yields:
+        tuple: The (src, dest) paths of each file whose name changes
+    """
+    for directory, f, destDirectory in files:
+        name = renamer(f)
 
         # Finally if the name is identical, then don't bother renaming it because it's wasted time.
         if name == f:
             continue
 
         # Now lets construct the full paths to copy from since we only currently have the name of the actual file.
-        src = os.path.join(inDirectory, f)
-        dest = os.path.join(outDirectory, name)
+        yield os.path.join(directory, f), os.path.join(destDirectory, name)
+
+
+def iterBatches(iterable, size):
+    """
+    A generator that groups the items of an iterable into lists of the given size.
+    Only one list is held in memory at a time.
+    Args:
+        iterable: Anything we can loop over
+        size: How many items go in each list
+
+    Yields:
+        list: The next batch of items. The last one may be shorter.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def readManifest(manifest, separator='\n'):
+    """
+    A generator that streams the paths out of a manifest file, without reading the whole file in at once.
+    Gzip compressed manifests are detected and decompressed on the fly.
+    Args:
+        manifest: The path to the manifest, or '-' to read it from stdin
+        separator: The character between each path, usually a new line or a NUL
+
+    Yields:
+        str: Each path in the manifest. Empty entries are skipped.
+    """
+    # We read the raw bytes rather than text, so paths that aren't valid text still come through untouched.
+    if manifest == '-':
+        stream = sys.stdin.buffer
+    else:
+        stream = open(manifest, 'rb')
+
+    with stream:
+        # Every gzip file starts with these two bytes, so we can peek at them without using them up.
+        if stream.peek(2)[:2] == b'\x1f\x8b':
+            stream = gzip.GzipFile(fileobj=stream, mode='rb')
+
+        separator = separator.encode()
+        leftover = b''
+        while True:
+            chunk = stream.read(1 << 16)
+            if not chunk:
+                break
+
+            # The last entry in a chunk may be cut in half, so we keep it back until the next chunk arrives.
+            entries = (leftover + chunk).split(separator)
+            leftover = entries.pop()
+            for entry in entries:
+                # Windows line endings leave a \r on the end of each line.
+                entry = entry.rstrip(b'\r')
+                if entry:
+                    yield os.fsdecode(entry)
+
+        leftover = leftover.rstrip(b'\r')
+        if leftover:
+            yield os.fsdecode(leftover)
+
+
+def manifestFiles(paths, inDirectory, outDirectory=None):
+    """
+    A generator that splits each manifest path into the form iterOperations expects.
+    Args:
+        paths: An iterable of file paths
+        inDirectory: The directory that relative paths are relative to
+        outDirectory: The directory to write to, or None to leave each file in its own directory
+
+    Yields:
+        tuple: The (directory, name, output directory) of each path
+    """
+    for path in paths:
+        directory, name = os.path.split(os.path.join(inDirectory, path))
+        yield directory, name, outDirectory or directory
+
+
+def walkFiles(directory, recursive=False, relDir=''):
+    """
+    A generator that gives back the files we should operate on inside the given directory.
+    Args:
+        directory: The top directory to walk
+        recursive: Whether to walk into sub directories as well
+        relDir: The sub directory we are currently in, relative to the top directory
+
+    Yields:
+        tuple: The sub directory relative to the top directory, and the name of the file
+    """
+    # scandir is a lot faster than listdir for large directories,
+    # because it gives us the file type from the directory listing without another call per file.
+    for entry in os.scandir(os.path.join(directory, relDir)):
+        # We will start by skipping over files that start with a dot.
+        # This is a sign that they are hidden and should not be modified.
+        if entry.name.startswith('.'):
+            continue
+
+        if recursive and entry.is_dir(follow_symlinks=False):
+            # yield from hands back everything the sub directory yields, as if we had yielded it ourselves.
+            yield from walkFiles(directory, recursive=True, relDir=os.path.join(relDir, entry.name))
+            continue
+
+        yield relDir, entry.name
+
+
+def getNewName(name, inString, outString, regex=False):
+    """
+    Gives back the new name for a file.
+    Args:
+        name: The current name of the file
+        inString: the input string to find and replace
+        outString: the output string to replace it with
+        regex: Whether inString is a regex pattern or a simple string
+
+    Returns:
+        str: The new name, which is the same as name if nothing matched
+    """
+    # If we are told to use regex, then lets use the regex module to replace the string.
+    if regex:
+        return re.sub(inString, outString, name)
+
+    # Otherwise lets just use regular string replace.
+    return name.replace(inString, outString)
+
+
+def loadRules(path):
+    """
+    Loads a rules file.
+    The file is a JSON list of rules, in the order they should be applied, for example:
+        [
+            {"find": "hello", "replace": "goodbye"},
+            {"find": "_v([0-9]+)", "replace": "_version\\1", "regex": true}
+        ]
+    Args:
+        path: The path to the rules file
+
+    Returns:
+        list: A list of rule dictionaries
+    """
+    with open(path, 'r') as f:
+        rules = json.load(f)
+
+    if not isinstance(rules, list):
+        raise ValueError("%s should contain a list of rules" % path)
+
+    return rules
+
+
+class RuleSet(object):
+    """
+    A set of find and replace rules that are applied to a name together, in a single pass.
+
+    All the plain string rules are compiled into one Aho-Corasick automaton, so a name is scanned once
+    no matter how many rules there are. The regex rules are compiled into one alternation, apart from any that
+    can't share a pattern with the others, which are searched for on their own.
+
+    Plain and regex rules are treated alike. Wherever two rules match at the same place, the one listed first wins,
+    and like str.replace and re.sub, matches never overlap. Because the rules are applied together, a rule never sees
+    what another rule has replaced. This is different from running cliRenamer once per rule.
+
+    Example of use:
+        rules = RuleSet([{'find': 'hello', 'replace': 'goodbye'}, {'find': 'v([0-9])', 'replace': 'v0\\1', 'regex': True}])
+        rules.apply('hello_v1.txt')
+        # 'goodbye_v01.txt'
+    """
+
+    # A regex that refers back to its own groups by number or name can't be put inside a bigger pattern,
+    # since its groups would be numbered differently there.
+    # This can also match an escaped backslash before a digit, which just means that rule is searched for on its own.
+    BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules: A list of rule dictionaries with find, replace and an optional regex key
+        """
+        plain = []
+        regexes = []
+        for priority, rule in enumerate(rules):
+            find = rule['find']
+            replace = rule.get('replace', '')
+            if not find:
+                raise ValueError("Rule %s has nothing to find" % priority)
+
+            if rule.get('regex'):
+                regexes.append((priority, find, replace))
+            else:
+                plain.append((priority, find, replace))
+
+        self.buildAutomaton(plain)
+        self.buildAlternation(regexes)
+
+    def buildAutomaton(self, rules):
+        """
+        Builds the Aho-Corasick automaton for the plain string rules.
+        Args:
+            rules: A list of (priority, find, replace) tuples, in priority order
+        """
+        # Each state is a position in a tree of all the find strings, where goto tells us which state each
+        # next character leads to. State 0 is the root, before we have matched anything.
+        self.goto = [{}]
+        # Each state also remembers which rules end there, as (length, priority) pairs.
+        self.outputs = [[]]
+        self.replacements = dict((priority, replace) for priority, find, replace in rules)
+
+        for priority, find, replace in rules:
+            state = 0
+            for char in find:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.outputs.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.outputs[state].append((len(find), priority))
+
+        # The fail links tell us where to carry on from when the next character doesn't continue the match.
+        # They point to the state for the longest ending of what we've matched that is also the start of a rule.
+        # We build them breadth first, so a state's fail link is always ready before its children need it.
+        self.fail = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, child in self.goto[state].items():
+                queue.append(child)
+
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+
+                # Any rule that ends at the fail state also ends here.
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def buildAlternation(self, rules):
+        """
+        Builds a single pattern that matches any of the regex rules that can share one,
+        and compiles the rest on their own.
+        Args:
+            rules: A list of (priority, pattern, replace) tuples, in priority order
+        """
+        # Each searcher is a compiled pattern and the priority of its rule, or None for the alternation.
+        self.searchers = []
+        # The rules on their own, by priority, with their replacements.
+        self.regexRules = {}
+        # The priority of the rule each group of the alternation wraps.
+        self.regexGroups = {}
+
+        # Flags set inside a pattern, like (?i), apply to the whole pattern, so they can only be used on their own.
+        defaultFlags = re.compile('').flags
+
+        parts = []
+        index = 1
+        for priority, pattern, replace in rules:
+            compiled = re.compile(pattern)
+            self.regexRules[priority] = (compiled, replace)
+
+            if compiled.groupindex or compiled.flags != defaultFlags or self.BACKREFERENCE.search(pattern):
+                self.searchers.append((compiled, priority))
+                continue
+
+            # We wrap each pattern in a group so we can tell which rule matched.
+            # The outer group of a rule is always the last group to close, so lastindex points straight at it.
+            self.regexGroups[index] = priority
+            parts.append('(%s)' % pattern)
+            index += compiled.groups + 1
+
+        if parts:
+            self.searchers.insert(0, (re.compile('|'.join(parts)), None))
+
+    def apply(self, name):
+        """
+        Gives back the new name after applying all the rules.
+        Args:
+            name: The name to rename
 
-        # If we're told to duplicate, we'll use the shutil library and its' copy2 function to copy the file.
+        Returns:
+            str: The new name, which is the same as name if nothing matched
+        """
+        plainMatches = self.findPlainMatches(name) if self.replacements else []
+        if not plainMatches and not self.searchers:
+            return name
+
+        # We walk along the name, each time taking whichever match comes next, with the earliest rule winning a tie.
+        # The next match of each regex is remembered, and only searched for again once we've gone past its start.
+        nextMatches = [None] * len(self.searchers)
+        plainIndex = 0
+        pieces = []
+        position = 0
+        while position <= len(name):
+            best = None
+
+            while plainIndex < len(plainMatches) and plainMatches[plainIndex][0] < position:
+                plainIndex += 1
+            if plainIndex < len(plainMatches):
+                start, priority, length = plainMatches[plainIndex]
+                best = (start, priority, start + length, self.replacements[priority])
+
+            for index, (pattern, priority) in enumerate(self.searchers):
+                match = nextMatches[index]
+                if match is None or (match and match.start() < position):
+                    # False means there are no more matches of this regex, so we never search for it again.
+                    match = nextMatches[index] = pattern.search(name, position) or False
+                if not match:
+                    continue
+
+                isAlternation = priority is None
+                if isAlternation:
+                    priority = self.regexGroups[match.lastindex]
+                if best and (best[0], best[1]) < (match.start(), priority):
+                    continue
+
+                if isAlternation:
+                    # The group numbers in the rule's replacement are relative to its own pattern, not the combined
+                    # one. Matching its own pattern at the same place gives us the same match with the right numbers.
+                    # Passing the position rather than slicing the string keeps lookbehinds and ^ working the same.
+                    compiled, replace = self.regexRules[priority]
+                    ruleMatch = compiled.match(name, match.start())
+                else:
+                    replace = self.regexRules[priority][1]
+                    ruleMatch = match
+                best = (ruleMatch.start(), priority, ruleMatch.end(), ruleMatch.expand(replace))
+
+            if not best:
+                break
+
+            start, priority, end, replacement = best
+            pieces.append(name[position:start])
+            pieces.append(replacement)
+            if end == start:
+                # Like re.sub, after an empty match we keep the next character and carry on after it.
+                pieces.append(name[start:start + 1])
+                end += 1
+            position = end
+
+        pieces.append(name[position:])
+        return ''.join(pieces)
+
+    def findPlainMatches(self, name):
+        """
+        Finds every match of the plain string rules in a single scan of the name.
+        Args:
+            name: The name to search
+
+        Returns:
+            list: A sorted list of (start, priority, length) tuples, which may overlap
+        """
+        # We walk the name one character at a time, collecting every match as (start, priority, length).
+        matches = []
+        state = 0
+        for position, char in enumerate(name):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+
+            for length, priority in self.outputs[state]:
+                matches.append((position - length + 1, priority, length))
+
+        # Sorting puts the leftmost matches first, with the earliest rule first where they start at the same place.
+        matches.sort()
+        return matches
+
+
+def transferFile(src, dest, duplicate=True, linkMode='copy'):
+    """
+    Copies or renames a single file.
+    This needs to live at the top level of the module so that a process pool is able to pickle it.
+    Args:
+        src: The path of the file to copy or rename
+        dest: The path to copy or rename it to
+        duplicate: Whether we should copy the file instead of renaming it
+        linkMode: How duplicates are made, one of LINK_MODES
+
+    Returns:
+        str: The destination path
+    """
+    # If we're told to duplicate, we'll find the cheapest way we're allowed to copy the file.
+    if duplicate:
+        mode = duplicateFile(src, dest, linkMode=linkMode)
+    else:
+        # Otherwise we'll just use the os module to rename the file.
+        os.rename(src, dest)
+        mode = 'rename'
+
+    logger.debug("%s: %s -> %s", mode, src, dest)
+    return dest
+
+
+def duplicateFile(src, dest, linkMode='copy'):
+    """
+    Duplicates a single file, using the cheapest method the link mode allows.
+
+    copy always does a full copy with shutil.copy2, like we always have.
+    hardlink makes dest another name for the same data. Changing one will change the other.
+    reflink asks the filesystem to share the data until one of the files is changed.
+    auto tries a reflink, then a copy done inside the kernel, and only then shutil.copy2.
+    It never makes hardlinks because they are not independent copies.
+
+    Whenever a method isn't supported (different drives, filesystems without reflinks, other operating systems)
+    we fall through to the next one, ending with shutil.copy2.
+
+    Args:
+        src: The path of the file to copy
+        dest: The path to copy it to
+        linkMode: One of LINK_MODES
+
+    Returns:
+        str: The method that was actually used: hardlink, reflink, copy_file_range, sendfile or copy
+    """
+    if linkMode not in LINK_MODES:
+        raise ValueError("%s is not a link mode, use one of %s" % (linkMode, ", ".join(LINK_MODES)))
+
+    if linkMode == 'hardlink':
+        try:
+            hardlinkFile(src, dest)
+            return 'hardlink'
+        except OSError:
+            pass
+
+    if linkMode in ('reflink', 'hardlink', 'auto'):
+        try:
+            return kernelCopyFile(src, dest, reflink=linkMode != 'hardlink')
+        except OSError:
+            pass
+
+    shutil.copy2(src, dest)
+    return 'copy'
+
+
+def hardlinkFile(src, dest):
+    """
+    Makes dest a hardlink to src, replacing dest if it already exists.
+    Args:
+        src: The path of the file to link to
+        dest: The path of the new link
+    """
+    # os.link won't write over an existing file, so we link to a temporary name next to it first
+    # and then swap it into place in a single step.
+    temp = os.path.join(os.path.dirname(dest), '.%s.%s.tmp' % (os.path.basename(dest), uuid.uuid4().hex[:8]))
+    os.link(src, temp)
+    try:
+        os.replace(temp, dest)
+    except OSError:
+        os.remove(temp)
+        raise
+
+
+def kernelCopyFile(src, dest, reflink=True):
+    """
+    Copies a file without passing the data through Python.
+    We try a reflink first if we're allowed to, then os.copy_file_range, then os.sendfile.
+    Args:
+        src: The path of the file to copy
+        dest: The path to copy it to
+        reflink: Whether to try a reflink first
+
+    Returns:
+        str: The method that was used: reflink, copy_file_range or sendfile
+
+    Raises:
+        OSError: If none of the methods are supported here.
+    """
+    with open(src, 'rb') as srcFile, open(dest, 'wb') as destFile:
+        mode = None
+
+        if reflink and fcntl:
+            try:
+                fcntl.ioctl(destFile.fileno(), FICLONE, srcFile.fileno())
+                mode = 'reflink'
+            except OSError:
+                pass
+
+        # copy_file_range and sendfile may copy less than we ask for, so we keep going until they give back 0.
+        # Both of them only exist on some systems, so we check for them before we use them.
+        for name in ('copy_file_range', 'sendfile'):
+            if mode or not hasattr(os, name):
+                continue
+            try:
+                if name == 'copy_file_range':
+                    while os.copy_file_range(srcFile.fileno(), destFile.fileno(), 1 << 30):
+                        pass
+                else:
+                    offset = 0
+                    while True:
+                        sent = os.sendfile(destFile.fileno(), srcFile.fileno(), offset, 1 << 30)
+                        if not sent:
+                            break
+                        offset += sent
+                mode = name
+            except OSError:
+                # If this failed part of the way through, we start the next method from the beginning.
+                srcFile.seek(0)
+                destFile.seek(0)
+                destFile.truncate()
+
+    if not mode:
+        raise OSError("No kernel copy is available for %s" % src)
+
+    # copy2 also copies over the permissions and modified times, so we do the same.
+    shutil.copystat(src, dest)
+    return mode
+
+
+def planOperations(operations, duplicate=True, exists=None):
+    """
+    Turns a list of copies or renames into a plan that can be run without overwriting anything.
+
+    The plan is a list of chains. Each chain is a list of (src, dest, duplicate) steps that have to run in order,
+    for example when a file is renamed to the name another file is moving away from.
+    Different chains never touch the same files, so they can run at the same time.
+    Swaps like a->b and b->a are broken up by moving one file to a temporary name first.
+    Chains and swaps only happen with renames. A copy leaves its source where it is, so when duplicating,
+    writing to any file that already exists would write over an original.
+
+    Args:
+        operations: A list of (src, dest) tuples
+        duplicate: Whether we should copy the files instead of renaming them
+        exists: An optional function to check if each destination exists, instead of listing the directories.
+                This is cheaper when there are only a few files in a big directory.
+
+    Returns:
+        list: A list of chains
+
+    Raises:
+        IOError: If two files would be written to the same destination, or a destination already exists.
+    """
+    # A dictionary lets us look up where any source is going, and the reverse lets us look up where any destination
+    # is coming from. Both are a single hash lookup, so the whole plan is worked out in one pass over the files.
+    destinations = {}
+    sources = {}
+    collisions = []
+    for src, dest in operations:
+        destinations[src] = dest
+        if dest in sources:
+            collisions.append("%s and %s -> %s" % (sources[dest], src, dest))
+        sources[dest] = src
+
+    # Instead of checking if every destination exists one at a time, we list each destination directory once.
+    existing = set()
+    listed = set()
+    if exists:
+        existing.update(dest for dest in sources if exists(dest))
+        listed.update(os.path.dirname(dest) for dest in sources)
+
+    for dest in sources:
+        destDir = os.path.dirname(dest)
+        if destDir in listed:
+            continue
+        listed.add(destDir)
+        if os.path.isdir(destDir):
+            existing.update(os.path.join(destDir, name) for name in os.listdir(destDir))
+
+    # When renaming, a destination that already exists is only safe if that file is itself being moved out of the way
+    # first. When duplicating nothing is moved, so every existing destination, and every source, would be written over.
+    for dest, src in sources.items():
+        if duplicate and dest in destinations:
+            collisions.append("%s -> %s would write over an original" % (src, dest))
+        elif dest in existing and (duplicate or dest not in destinations):
+            collisions.append("%s -> %s already exists" % (src, dest))
+
+    if collisions:
+        raise IOError("These files would be overwritten:\n    %s" % "\n    ".join(collisions))
+
+    plan = []
+    visited = set()
+
+    # Files that nobody else is writing to are the start of a chain.
+    # We follow each one along to the end, and then run the chain backwards so that every file has moved out of
+    # the way before something else is written over it.
+    for src, dest in operations:
+        if src in sources:
+            continue
+
+        chain = []
+        while src in destinations:
+            visited.add(src)
+            chain.append((src, destinations[src], duplicate))
+            src = destinations[src]
+
+        chain.reverse()
+        plan.append(chain)
+
+    # Anything we haven't visited yet must be part of a cycle, like a->b and b->a.
+    for src, dest in operations:
+        if src in visited:
+            continue
+
+        # We break the cycle by moving the first file out of the way to a hidden temporary name.
+        temp = os.path.join(os.path.dirname(src), '.%s.%s.tmp' % (os.path.basename(src), uuid.uuid4().hex[:8]))
+        chain = [(src, temp, duplicate)]
+        visited.add(src)
+
+        # Then we walk backwards round the cycle, filling in each name as soon as it has been freed up.
+        current = sources[src]
+        while current != src:
+            visited.add(current)
+            chain.append((current, destinations[current], duplicate))
+            current = sources[current]
+
+        # Finally the temporary file takes its real name. It is always a rename because the temporary file is ours.
+        chain.append((temp, dest, False))
+        plan.append(chain)
+
+    return plan
+
+
+def runChain(chain, linkMode='copy', resume=False, startStep=None, stepDone=None):
+    """
+    Runs the steps of a single chain in order.
+    Args:
+        chain: A list of (src, dest, duplicate) steps
+        linkMode: How duplicates are made, one of LINK_MODES
+        resume: Whether this chain may have been part way through when a job died.
+                Renames that have already happened are skipped.
+                We can't tell if a copy has happened, since its source is still there. A copy on its own is simply
+                made again, but in a longer chain a later step may already have written over the copy's source.
+                planOperations only ever gives copies a chain of their own, so such a chain can't be resumed.
+        startStep: When retrying a chain, the index of the step that failed. The steps before it are skipped.
+                   The failed step may still have happened, so if it is a rename it is checked like when resuming.
+                   If it is a copy it is simply made again, since only the steps after it write over its source.
+        stepDone: An optional function that is called with the index of each step once it has run
+
+    Returns:
+        int: The number of steps that were run
+
+    Raises:
+        IOError: If resuming a chain with more than one step that includes a copy
+    """
+    if resume:
+        checkResumable(chain)
+
+    for index in range(startStep or 0, len(chain)):
+        src, dest, duplicate = chain[index]
+
+        # A rename has already happened if its source has gone and its destination is there.
+        check = resume or index == startStep
+        if not (check and not duplicate and not os.path.lexists(src) and os.path.lexists(dest)):
+            transferFile(src, dest, duplicate=duplicate, linkMode=linkMode)
+
+        if stepDone:
+            stepDone(index)
+
+    return len(chain)
+
+
+def checkResumable(chain):
+    """
+    Checks that a chain can be resumed without knowing how far it got. See runChain.
+    Raises:
+        IOError: If the chain has more than one step and includes a copy
+    """
+    if len(chain) > 1 and any(duplicate for src, dest, duplicate in chain):
+        raise IOError("Can't tell how far this chain got, so its copies can't safely be made again:\n    %s" %
+                      "\n    ".join("%s -> %s" % (src, dest) for src, dest, duplicate in chain))
+
+
+def runOperations(plan, jobs=1, processes=False, progress=None, linkMode='copy', chainDone=None, resume=False,
+                  concurrency=None):
+    """
+    Runs a plan of copies or renames, optionally spread across a pool of threads or processes.
+    Args:
+        plan: A list of chains, as given back by planOperations
+        jobs: How many chains to run at the same time
+        processes: Whether the jobs should run in a pool of processes instead of threads
+        progress: An optional function that is called with (done, total) as files are processed
+        linkMode: How duplicates are made, one of LINK_MODES
+        chainDone: An optional function that is called with the index of each chain in the plan once it has run
+        resume: Whether the chains may have been part way through when a job died. See runChain.
+        concurrency: If given, run with asyncio keeping this many chains in flight. See runOperationsAsync.
+
+    Returns:
+        int: The number of files that were processed
+    """
+    if concurrency:
+        return asyncio.run(runOperationsAsync(plan, concurrency=concurrency, progress=progress, linkMode=linkMode,
+                                              chainDone=chainDone, resume=resume))
+
+    total = sum(len(chain) for chain in plan)
+    done = 0
+
+    # partial gives us a version of runChain with the link mode already filled in, so the pool only has to pass the chain.
+    run = partial(runChain, linkMode=linkMode, resume=resume)
+
+    # With only one job there is nothing to gain from a pool, so we just loop like we always have.
+    if jobs <= 1:
+        for index, chain in enumerate(plan):
+            done += run(chain)
+            if chainDone:
+                chainDone(index)
+            if progress:
+                progress(done, total)
+        return total
+
+    # Threads are great when most of the time is spent waiting on the disk, which is true for copies and renames.
+    # Processes avoid sharing a single interpreter, at the cost of sending every path over to the workers.
+    if processes:
+        pool = futures.ProcessPoolExecutor(max_workers=jobs)
+        # Sending the work over in chunks means we don't pay the cost of talking to a process for every single file.
+        chunksize = max(1, len(plan) // (jobs * 4))
+    else:
+        pool = futures.ThreadPoolExecutor(max_workers=jobs)
+        chunksize = 1
+
+    with pool:
+        # Each chain is one job, since the steps inside it have to run in order.
+        # map gives back the results in order as they finish, and raises any error a job ran into.
+        # The journal is only ever written to from here, so the jobs never have to share it.
+        for index, count in enumerate(pool.map(run, plan, chunksize=chunksize)):
+            done += count
+            if chainDone:
+                chainDone(index)
+            if progress:
+                progress(done, total)
+
+    return total
+
+
+async def runOperationsAsync(plan, concurrency=16, progress=None, linkMode='copy', chainDone=None, resume=False,
+                             retries=5, retryDelay=0.1):
+    """
+    Runs a plan of copies or renames with asyncio.
+
+    On network filesystems each rename or copy spends most of its time waiting for the server to answer.
+    Rather than waiting for each one in turn, we keep a number of them in flight at once.
+    The filesystem calls themselves still block, so they run in a thread pool while the event loop keeps track of them.
+    Errors that are likely to go away on their own, like timeouts and stale handles, are retried with a growing delay.
+
+    Args:
+        plan: A list of chains, as given back by planOperations
+        concurrency: How many chains to keep in flight at once
+        progress: An optional function that is called with (done, total) as files are processed
+        linkMode: How duplicates are made, one of LINK_MODES
+        chainDone: An optional function that is called with the index of each chain in the plan once it has run
+        resume: Whether the chains may have been part way through when a job died. See runChain.
+        retries: How many times to retry a chain after a transient error
+        retryDelay: How many seconds to wait before the first retry. It doubles with each retry after that.
+
+    Returns:
+        int: The number of files that were processed
+    """
+    total = sum(len(chain) for chain in plan)
+    state = {'done': 0}
+
+    loop = asyncio.get_running_loop()
+    pool = futures.ThreadPoolExecutor(max_workers=concurrency)
+
+    # Every worker takes the next chain from the same iterator, so there are never more than concurrency chains
+    # in flight, and we never have to make a task for every chain in the plan up front.
+    chains = iter(enumerate(plan))
+
+    async def worker():
+        for index, chain in chains:
+            attempt = 0
+            # We keep track of how many steps of the chain have run, so a retry carries on from the step that failed
+            # instead of running the whole chain again. The chain runs on a pool thread, but only one at a time.
+            stepsDone = [0]
+
+            def stepDone(stepIndex, stepsDone=stepsDone):
+                stepsDone[0] = stepIndex + 1
+
+            while True:
+                run = partial(runChain, chain, linkMode=linkMode, resume=resume,
+                              startStep=stepsDone[0] if attempt else None, stepDone=stepDone)
+                try:
+                    await loop.run_in_executor(pool, run)
+                    break
+                except OSError as error:
+                    if error.errno not in TRANSIENT_ERRORS or attempt >= retries:
+                        raise
+
+                    delay = retryDelay * 2 ** attempt
+                    logger.debug("retrying in %.2fs after %s", delay, error)
+                    # Sleeping here lets the other workers carry on while this one waits.
+                    await asyncio.sleep(delay)
+                    attempt += 1
+
+            # The workers all run on the event loop's thread, so they can share these without a lock.
+            state['done'] += len(chain)
+            if chainDone:
+                chainDone(index)
+            if progress:
+                progress(state['done'], total)
+
+    with pool:
+        await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+
+    return total
+
+
+class Journal(object):
+    """
+    An append only record of a job, so that it can be finished or undone if it dies part way through.
+
+    Each line of the file is a JSON object. The plan is written first, one line per chain, and then a line is added
+    as each chain completes. To keep things fast, the file is only synced to disk every so many completed chains,
+    and always before anything runs and when the journal is closed.
+
+    Example of use:
+        journal = Journal('rename.journal')
+        chainIds = journal.addPlan(plan)
+        journal.markDone(chainIds[0])
+        journal.close()
+    """
+
+    def __init__(self, path, syncEvery=1000):
+        """
+        Args:
+            path: The path of the journal file. If it already exists, we carry on adding to it.
+            syncEvery: How many completed chains to write between each sync to disk
+        """
+        self.path = path
+        self.syncEvery = syncEvery
+        self.unsynced = 0
+
+        # Carrying on from an existing journal means our chain ids need to carry on from its last one too.
+        self.nextId = 0
+        if os.path.exists(path):
+            chains, done, rolledBack = Journal.load(path)
+            if chains:
+                self.nextId = max(chains) + 1
+
+        self.file = open(path, 'a')
+
+    @staticmethod
+    def load(path):
+        """
+        Reads a journal back in.
+        Args:
+            path: The path of the journal file
+
+        Returns:
+            tuple: A dictionary of chain id to chain, a list of the completed chain ids in the order they completed,
+                   and a set of the chain ids that have been rolled back
+        """
+        chains = {}
+        done = []
+        rolledBack = set()
+
+        with open(path, 'r') as f:
+            for line in f:
+                # If we died part way through writing a line, the last line may be cut off, so we ignore it.
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+
+                if 'chain' in record:
+                    chains[record['chain']] = [tuple(step) for step in record['steps']]
+                elif 'done' in record:
+                    done.append(record['done'])
+                elif 'rolledBack' in record:
+                    rolledBack.add(record['rolledBack'])
+
+        return chains, done, rolledBack
+
+    def write(self, record):
+        """
+        Adds a single record to the end of the journal.
+        """
+        self.file.write(json.dumps(record) + '\n')
+
+    def sync(self):
+        """
+        Makes sure everything we have written is actually on the disk.
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def addPlan(self, plan):
+        """
+        Records a plan before it runs.
+        Args:
+            plan: A list of chains, as given back by planOperations
+
+        Returns:
+            list: The id given to each chain, in the same order as the plan
+        """
+        chainIds = []
+        for chain in plan:
+            self.write({'chain': self.nextId, 'steps': chain})
+            chainIds.append(self.nextId)
+            self.nextId += 1
+
+        # The plan has to be safely on disk before we change any files.
+        self.sync()
+        return chainIds
+
+    def markDone(self, chainId):
+        """
+        Records that a chain has completed.
+        """
+        self.write({'done': chainId})
+        self.unsynced += 1
+        if self.unsynced >= self.syncEvery:
+            self.sync()
+
+    def markRolledBack(self, chainId):
+        """
+        Records that a chain has been undone.
+        """
+        self.write({'rolledBack': chainId})
+        self.unsynced += 1
+        if self.unsynced >= self.syncEvery:
+            self.sync()
+
+    def close(self):
+        """
+        Syncs and closes the journal.
+        """
+        self.sync()
+        self.file.close()
+
+
+def resumeJournal(path, jobs=1, processes=False, progress=None, linkMode='copy', concurrency=None):
+    """
+    Finishes a job that died part way through.
+    The plan comes from the journal, so no directories are listed, and completed chains are skipped without
+    looking at their files at all. Only the chains that were still running are checked step by step.
+    With a manifest, only the batches that were planned before the job died are in the journal.
+    Args:
+        path: The path of the journal file
+        jobs: How many chains to run at the same time
+        processes: Whether the jobs should run in a pool of processes instead of threads
+        progress: An optional function that is called with (done, total) as files are processed
+        linkMode: How duplicates are made, one of LINK_MODES
+        concurrency: If given, run with asyncio keeping this many chains in flight. See runOperationsAsync.
+
+    Returns:
+        int: The number of files that were processed
+    """
+    chains, done, rolledBack = Journal.load(path)
+
+    # A set lets us check each chain in a single lookup.
+    finished = set(done) | rolledBack
+    chainIds = [chainId for chainId in sorted(chains) if chainId not in finished]
+    plan = [chains[chainId] for chainId in chainIds]
+
+    # We check every chain can be resumed before we change anything, so we never leave the job half finished.
+    for chain in plan:
+        checkResumable(chain)
+
+    journal = Journal(path)
+    try:
+        return runOperations(plan, jobs=jobs, processes=processes, progress=progress, linkMode=linkMode,
+                             chainDone=lambda index: journal.markDone(chainIds[index]), resume=True,
+                             concurrency=concurrency)
+    finally:
+        journal.close()
+
+
+def rollbackJournal(path):
+    """
+    Undoes a job, newest step first.
+    Renames are renamed back and copies are removed. A chain that can't be fully undone is left exactly as it is,
+    and the rest are still undone. See undoChain.
+    Args:
+        path: The path of the journal file
+
+    Returns:
+        int: The number of steps that were undone
+
+    Raises:
+        IOError: If any chains couldn't be undone, once all the others have been
+    """
+    chains, done, rolledBack = Journal.load(path)
+
+    # The completed chains are undone in the reverse order they completed.
+    # Then any chains that were still running when the job died, which we have to check step by step.
+    finished = set(done)
+    order = [(chainId, True) for chainId in reversed(done)]
+    order += [(chainId, False) for chainId in sorted(chains, reverse=True) if chainId not in finished]
+
+    undone = 0
+    refused = []
+    journal = Journal(path)
+    try:
+        for chainId, complete in order:
+            if chainId in rolledBack:
+                continue
+
+            try:
+                undone += undoChain(chains[chainId], complete=complete)
+            except IOError as error:
+                # This chain is left as it is, and isn't marked as rolled back, so it can be sorted out by hand.
+                logger.error(error)
+                refused.append(chainId)
+                continue
+
+            journal.markRolledBack(chainId)
+            rolledBack.add(chainId)
+    finally:
+        journal.close()
+
+    if refused:
+        raise IOError("%s chains could not be undone and were left as they are" % len(refused))
+
+    return undone
+
+
+def undoChain(chain, complete=True):
+    """
+    Undoes the steps of a single chain, last step first.
+
+    Any file the chain read before it wrote to it was there before the job, so it is never removed.
+    If a copy wrote over one of those, which older versions allowed when duplicating files onto each other's names,
+    the file can't be restored, so we refuse to undo the chain at all.
+    Every step is checked before anything is touched, so a chain we refuse is left exactly as it is.
+
+    Args:
+        chain: A list of (src, dest, duplicate) steps
+        complete: Whether the chain is known to have finished. If not, we check each step actually happened.
+
+    Returns:
+        int: The number of steps that were undone
+
+    Raises:
+        IOError: If the chain can't be undone without losing a file
+    """
+    # The files that were there before the job are the ones the chain read before writing to them.
+    # Temporary files are written first and read later, so they aren't included.
+    originals = set()
+    written = set()
+    for src, dest, duplicate in chain:
+        if src not in written:
+            originals.add(src)
+        written.add(dest)
+
+    # We work out every undo first, keeping track of what each one would change, so the checks for later
+    # undos see the files as they would be by then.
+    changed = {}
+
+    def exists(path):
+        return changed[path] if path in changed else os.path.lexists(path)
+
+    undos = []
+    for src, dest, duplicate in reversed(chain):
+        if not duplicate:
+            if exists(dest) and not exists(src):
+                undos.append((src, dest, duplicate))
+                changed[dest] = False
+                changed[src] = True
+            elif complete:
+                raise IOError("Can't undo %s -> %s, the files have changed since the job ran" % (src, dest))
+            # Otherwise the job died before this rename happened.
+            continue
+
+        if dest in originals:
+            raise IOError("Can't undo %s -> %s, the copy was written over a file that was there before" % (src, dest))
+
+        if exists(dest):
+            undos.append((src, dest, duplicate))
+            changed[dest] = False
+
+    for src, dest, duplicate in undos:
         if duplicate:
-            shutil.copy2(src, dest)
+            os.remove(dest)
+            logger.debug("undo copy: removed %s", dest)
         else:
-            # Otherwise we'll just use the os module to rename the file.
-            os.rename(src, dest)
+            os.rename(dest, src)
+            logger.debug("undo rename: %s -> %s", dest, src)
+
+    return len(undos)
+
+
+def printPlan(plan):
+    """
+    Prints every step of a plan, in the order it would run.
+    Args:
+        plan: A list of chains, as given back by planOperations
+    """
+    for chain in plan:
+        for src, dest, duplicate in chain:
+            print("%s %s -> %s" % ('copy' if duplicate else 'rename', src, dest))
+
+
+def printProgress(done, total):
+    """
+    Prints a single progress line that updates in place.
+    Args:
+        done: How many files have been processed so far
+        total: How many files there are to process, or None if we don't know yet
+    """
+    # We write to stderr so the progress doesn't get mixed in with any output that is being piped somewhere else.
+    # The \r moves us back to the start of the line so that each update writes over the last one.
+    # When we're streaming we don't know the total yet, so we just show how many we've done.
+    if total is None:
+        sys.stderr.write("\r%s files" % done)
+        sys.stderr.flush()
+        return
+
+    sys.stderr.write("\r%s/%s files" % (done, total))
+    if done == total:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
 
 
 
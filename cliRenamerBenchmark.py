@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+# The concurrent.futures module lets us run each benchmark in a brand new process,
+# so the peak memory we measure belongs to that benchmark alone.
+from concurrent import futures
+
+# The resource module only exists on unix systems. Without it we just can't report the memory use.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import cliRenamer
+
+# These are the modes we time, and the arguments we give to cliRenamer.rename for each of them.
+MODES = {
+    "rename": dict(inString="hello", outString="goodbye", duplicate=False),
+    "duplicate": dict(inString="hello", outString="goodbye", duplicate=True),
+    "regex": dict(inString="hel+o_([0-9]+)", outString=r"goodbye_\1", duplicate=False, regex=True),
+}
+
+# How many files we put in each sub directory of the synthetic tree.
+FILES_PER_DIRECTORY = 1000
+
+
+def main():
+    """
+        Builds synthetic directory trees, times cliRenamer on them and writes the results to a JSON file.
+        Example of use:
+            python cliRenamerBenchmark.py --sizes 1000 100000 --out before.json
+            python cliRenamerBenchmark.py --sizes 1000 100000 --out after.json --compare before.json
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks cliRenamer on synthetic directories")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000],
+                        help="How many files to create for each run. Add 1000000 for the largest run")
+    parser.add_argument('--name-lengths', dest='nameLengths', type=int, nargs='+', default=[16, 64],
+                        help="How long the file names should be")
+    parser.add_argument('--match-ratios', dest='matchRatios', type=float, nargs='+', default=[0.1, 1.0],
+                        help="The fraction of files whose names should match")
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=sorted(MODES),
+                        help="Which modes to time")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="Passed through to cliRenamer.rename")
+    parser.add_argument('--dir', help="Where to build the synthetic trees. Defaults to the system temp directory")
+    parser.add_argument('-o', '--out', default='cliRenamerBenchmark.json', help="The JSON file to write results to")
+    parser.add_argument('--compare', help="A previous results file to compare against")
+    args = parser.parse_args()
+
+    results = runBenchmarks(args.sizes, args.nameLengths, args.matchRatios, args.modes,
+                            jobs=args.jobs, directory=args.dir)
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    printResults(results)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+        printComparison(previous, results)
+
+
+def runBenchmarks(sizes, nameLengths, matchRatios, modes, jobs=1, directory=None):
+    """
+    Times every combination of the given sizes, name lengths, match ratios and modes.
+    Args:
+        sizes: A list of how many files to create
+        nameLengths: A list of file name lengths
+        matchRatios: A list of the fraction of files that should match
+        modes: A list of keys from MODES
+        jobs: Passed through to cliRenamer.rename
+        directory: Where to build the synthetic trees
+
+    Returns:
+        dict: Information about this run, with a list of results
+    """
+    results = []
+    for size in sizes:
+        for nameLength in nameLengths:
+            for matchRatio in matchRatios:
+                for mode in modes:
+                    result = runBenchmark(size, nameLength, matchRatio, mode, jobs=jobs, directory=directory)
+                    results.append(result)
+                    printResult(result)
+
+    return {
+        "commit": getCommit(),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "jobs": jobs,
+        "results": results,
+    }
+
+
+def runBenchmark(size, nameLength, matchRatio, mode, jobs=1, directory=None):
+    """
+    Builds a synthetic tree and times a single mode on it.
+    Args:
+        size: How many files to create
+        nameLength: How long the file names should be
+        matchRatio: The fraction of files that should match
+        mode: A key from MODES
+        jobs: Passed through to cliRenamer.rename
+        directory: Where to build the synthetic tree
+
+    Returns:
+        dict: The result of this benchmark
+    """
+    root = tempfile.mkdtemp(prefix='cliRenamerBenchmark', dir=directory)
+    try:
+        buildTree(root, size, nameLength, matchRatio)
+
+        # Each benchmark runs in a new process, so the peak memory isn't left over from building the tree
+        # or from the benchmarks that came before it.
+        with futures.ProcessPoolExecutor(max_workers=1) as pool:
+            seconds, files, peakRss = pool.submit(timeRename, root, mode, jobs).result()
+    finally:
+        shutil.rmtree(root)
+
+    return {
+        "size": size,
+        "nameLength": nameLength,
+        "matchRatio": matchRatio,
+        "mode": mode,
+        "files": files,
+        "seconds": seconds,
+        "filesPerSecond": files / seconds if seconds else None,
+        "peakRssKb": peakRss,
+    }
+
+
+def buildTree(root, size, nameLength, matchRatio, seed=0):
+    """
+    Fills a directory with empty files, spread over sub directories.
+    Args:
+        root: The directory to fill
+        size: How many files to create
+        nameLength: How long the file names should be
+        matchRatio: The fraction of files whose name contains the word the benchmarks look for
+        seed: The random seed, so that every run builds the same tree
+    """
+    rand = random.Random(seed)
+    directory = None
+    for index in range(size):
+        if index % FILES_PER_DIRECTORY == 0:
+            directory = os.path.join(root, 'dir%05d' % (index // FILES_PER_DIRECTORY))
+            os.mkdir(directory)
+
+        # Every name starts with the word and its index, so the names are always unique,
+        # and then we pad it out with random letters until it's long enough.
+        word = 'hello' if rand.random() < matchRatio else 'world'
+        name = '%s_%d_' % (word, index)
+        name += ''.join(rand.choice(string.ascii_lowercase) for _ in range(nameLength - len(name)))
+
+        open(os.path.join(directory, name), 'w').close()
+
+
+def timeRename(root, mode, jobs=1):
+    """
+    Times cliRenamer.rename on a directory. This is run inside its own process.
+    Args:
+        root: The directory to rename files in
+        mode: A key from MODES
+        jobs: Passed through to cliRenamer.rename
+
+    Returns:
+        tuple: The seconds it took, how many files were processed and the peak memory in kilobytes
+    """
+    start = time.perf_counter()
+    files = cliRenamer.rename(inDirectory=root, recursive=True, jobs=jobs, **MODES[mode])
+    seconds = time.perf_counter() - start
+
+    return seconds, files, getPeakRss()
+
+
+def getPeakRss():
+    """
+    Gives back the peak memory use of this process.
+    Returns:
+        int: The peak memory in kilobytes, or None if we can't tell on this system
+    """
+    if not resource:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS gives us bytes where Linux gives us kilobytes.
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+def getCommit():
+    """
+    Gives back the git commit we're benchmarking, so results files can be told apart.
+    Returns:
+        str: The commit hash, or None if we're not in a git repository
+    """
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)),
+                                         stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.decode().strip()
+
+
+def getKey(result):
+    """
+    Gives back what makes a result unique, so we can match it up with the same benchmark from another run.
+    """
+    return result['size'], result['nameLength'], result['matchRatio'], result['mode']
+
+
+def printResult(result):
+    """
+    Prints a single result on one line.
+    """
+    print("%(mode)-10s size=%(size)-8d name=%(nameLength)-4d match=%(matchRatio)-5.2f "
+          "files=%(files)-8d %(seconds)8.3fs %(filesPerSecond)12.1f files/s  peak=%(peakRssKb)s KB" %
+          dict(result, filesPerSecond=result['filesPerSecond'] or 0))
+
+
+def printResults(results):
+    """
+    Prints a summary of a whole run.
+    """
+    print("\nResults for commit %s, written with python %s" % (results['commit'], results['python']))
+
+
+def printComparison(previous, current):
+    """
+    Prints how the speed of each benchmark changed between two runs.
+    Args:
+        previous: The results of an earlier run
+        current: The results of this run
+    """
+    print("\nCompared with commit %s" % previous.get('commit'))
+
+    before = dict((getKey(result), result) for result in previous['results'])
+    for result in current['results']:
+        old = before.get(getKey(result))
+        if not old or not old['filesPerSecond'] or not result['filesPerSecond']:
+            continue
+
+        change = result['filesPerSecond'] / old['filesPerSecond']
+        # We flag anything more than 10% slower so it stands out.
+        flag = "  <-- slower" if change < 0.9 else ""
+        print("%-10s size=%-8d name=%-4d match=%-5.2f %6.2fx%s" % (result['mode'], result['size'],
+                                                                   result['nameLength'], result['matchRatio'],
+                                                                   change, flag))
+
+
+# If our namespace is main, run main().
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,8 @@
 from maya import cmds
+# An OrderedDict remembers the order things were added, which lets us find the gear that was used longest ago.
+from collections import OrderedDict
+# The side faces are worked out the same way as in gearCreator, and remembered for each number of teeth.
+from gearCreator import getSideFaces
 
 class Gear(object) :
     """
@@ -10,8 +14,18 @@ class Gear(object) :
         gear = gearCreator.Gear()
         gear.createGear()
         gear.changeTeeth(teeth=12, length=0.4)
+
+        # When we need lots of the same gear, the first is built once and the rest are copied from it.
+        for i in range(20):
+            gearCreator.Gear().createGear(teeth=12, cached=True, instance=True)
     """
 
+    # The gears we've built to copy from, by (teeth, length), with the one used longest ago first.
+    # We remember their UUIDs, so we still find them if they're renamed.
+    prototypes = OrderedDict()
+    # How many gears to remember. When there are more, the one used longest ago is forgotten.
+    maxPrototypes = 16
+
     # When we first initialize a new gear, set these values.
     def __init__(self):
         # The init method lets us set default values.
@@ -19,44 +33,81 @@ class Gear(object) :
         self.extrude = None
         self.constructor = None
 
-    def createGear( self, teeth=10, length=-0.3 ):
+    def createGear( self, teeth=10, length=-0.3, cached=False, instance=False ):
         """
 
         Args:
             teeth: The number of teeth to create.
             length: The length of the teeth.
+            cached: Whether to copy a gear we've already built with the same teeth and length.
+                    Cached gears have their construction history deleted, so changeTeeth can't change them.
+            instance: Whether cached gears should be instances of the first one, which share its mesh,
+                      rather than duplicates with their own mesh.
 
         Returns:
 
         """
+        if cached :
+            self.createCachedGear(teeth, length, instance)
+            return
+
         spans = teeth * 2
 
         self.transform, self.constructor = cmds.polyPipe(subdivisionsAxis=spans)
 
-        sideFaces = range(spans * 2, spans * 3, 2)
+        # We give all the faces to the extrude at once, instead of selecting them one at a time.
+        sideFaces = ['%s.%s' % (self.transform, face) for face in getSideFaces(teeth)]
+
+        # Because this gives us back a list, we have '[0]' on the end to signify the first element of the list.
+        self.extrude = cmds.polyExtrudeFacet(sideFaces, localTranslateZ=length)[0]
 
-        # Clear any current selection.
-        cmds.select(clear=True)
 
-        for face in sideFaces:
-            # add=True keeps adding to the selection.
-            cmds.select('%s.f[%s]' % (self.transform, face), add=True)
+    def createCachedGear( self, teeth, length, instance ) :
+        key = (teeth, length)
 
-        # Because this gives us back a list, we have '[0]' on the end to signify the first element of the list.
-        self.extrude = cmds.polyExtrudeFacet(localTranslateZ=length)[0]
+        # If the gear we built before has been deleted, we forget it and build a new one.
+        prototype = None
+        if key in Gear.prototypes :
+            prototype = (cmds.ls(Gear.prototypes[key], long=True) or [None])[0]
+            if not prototype :
+                del Gear.prototypes[key]
+
+        if prototype :
+            # Move it to the end, since it's now the one used most recently.
+            Gear.prototypes.move_to_end(key)
+
+            if instance :
+                self.transform = cmds.instance(prototype)[0]
+            else :
+                self.transform = cmds.duplicate(prototype)[0]
 
+            self.constructor = None
+            self.extrude = None
+            return
+
+        self.createGear(teeth=teeth, length=length)
+
+        # Deleting the history leaves just the mesh, so the scene doesn't have to evaluate the pipe and extrude,
+        # and copies don't bring them along.
+        cmds.delete(self.transform, constructionHistory=True)
+        self.constructor = None
+        self.extrude = None
+
+        Gear.prototypes[key] = cmds.ls(self.transform, uuid=True)[0]
+        while len(Gear.prototypes) > Gear.maxPrototypes :
+            # last=False gives us the one used longest ago.
+            Gear.prototypes.popitem(last=False)
 
     def changeTeeth( self, teeth=10, length=0.3 ) :
+        # Cached gears don't have the pipe and extrude nodes any more.
+        if not self.constructor or not self.extrude :
+            raise RuntimeError("This gear has no construction history to change. Create it without cached=True.")
+
         spans = teeth*2
 
         cmds.polyPipe(self.constructor, edit=True, subdivisionsAxis=spans)
 
-        sideFaces = range(spans*2, spans*3, 2)
-        faceNames = []
-
-        for face in sideFaces :
-            faceName = 'f[%s]' % (face)
-            faceNames.append(faceName)
+        faceNames = getSideFaces(teeth)
 
         cmds.setAttr('%s.inputComponents' % (self.extrude), len(faceNames), *faceNames, type="componentList")
 
@@ -1,5 +1,27 @@
 from maya import cmds
 
+# The side faces for each number of teeth we've made, so we only work them out once.
+sideFacesCache = {}
+
+
+def getSideFaces( teeth ) :
+    """
+    Gives back the faces of a pipe that get extruded into teeth.
+    Args:
+        teeth: The number of teeth
+
+    Returns: A tuple of face names, like ('f[40]', 'f[42]', ...), that can be added to the end of an object's name
+             or given straight to a componentList.
+
+    """
+    if teeth not in sideFacesCache :
+        # Teeth are every alternate face, so spans x 2
+        spans = teeth * 2
+        sideFacesCache[teeth] = tuple('f[%s]' % face for face in range(spans*2, spans*3, 2))
+
+    return sideFacesCache[teeth]
+
+
 # Default values teeth = 10, length = 0.3.
 def createGear( teeth=10, length=0.3 ) :
     """
@@ -16,17 +38,11 @@ def createGear( teeth=10, length=0.3 ) :
 
     transform, constructor = cmds.polyPipe(subdivisionsAxis=spans)
 
-    sideFaces = range(spans*2, spans*3, 2)
-
-    # Clear any current selection.
-    cmds.select(clear=True)
-
-    for face in sideFaces :
-        # add=True keeps adding to the selection.
-        cmds.select('%s.f[%s]' % (transform, face), add=True)
+    # We give all the faces to the extrude at once, instead of selecting them one at a time.
+    sideFaces = ['%s.%s' % (transform, face) for face in getSideFaces(teeth)]
 
     # Because this gives us back a list, we have '[0]' on the end to signify the first element of the list.
-    extrude = cmds.polyExtrudeFacet(localTranslateZ=length)[0]
+    extrude = cmds.polyExtrudeFacet(sideFaces, localTranslateZ=length)[0]
 
     return transform, constructor, extrude
 
@@ -35,12 +51,7 @@ def changeTeeth( constructor, extrude, teeth=10, length=0.3 ) :
 
     cmds.polyPipe(constructor, edit=True, subdivisionsAxis=spans)
 
-    sideFaces = range(spans*2, spans*3, 2)
-    faceNames = []
-
-    for face in sideFaces :
-        faceName = 'f[%s]' % (face)
-        faceNames.append(faceName)
+    faceNames = getSideFaces(teeth)
 
     cmds.setAttr('%s.inputComponents' % (extrude), len(faceNames), *faceNames, type="componentList")
 
@@ -0,0 +1,219 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+
+# The concurrent.futures module gives us a pool of processes, so we can build a gear on every core at once.
+from concurrent import futures
+
+from gearMesh import GearMesh
+
+# The file extension for each format we can write, and the GearMesh method that writes it.
+FORMATS = {
+    "obj": (".obj", "writeObj"),
+    "buffer": (".gear", "writeBuffer"),
+}
+
+# The name of the manifest that lists every variant in an output directory.
+MANIFEST_NAME = "manifest.json"
+
+# The GearMesh arguments we can sweep over, the type of their values and the values used if they aren't swept.
+PARAMETERS = [
+    ("teeth", int, [10]),
+    ("length", float, [0.3]),
+    ("radius", float, [1.0]),
+    ("height", float, [2.0]),
+    ("thickness", float, [0.5]),
+    ("bevel", float, [0.0]),
+]
+
+
+def main():
+    """
+    Builds every combination of gear parameters and writes them to a directory, with a manifest listing them all.
+    Each value can be a single number or an inclusive range of start:stop or start:stop:step.
+    Example of use:
+        python gearFarm.py --teeth 5:30 --length 0.2:0.6:0.1 --bevel 0 0.25 --out gears
+    """
+    parser = argparse.ArgumentParser(description="Builds a catalogue of gear variants")
+    for name, valueType, default in PARAMETERS:
+        parser.add_argument('--%s' % name, nargs='+', default=[str(value) for value in default],
+                            help="The %s values to build. Defaults to %s" % (name, default[0]))
+    parser.add_argument('-o', '--out', required=True, help="The directory to write the gears and manifest to")
+    parser.add_argument('-f', '--format', choices=sorted(FORMATS), default="obj", help="The file format to write")
+    parser.add_argument('-j', '--jobs', type=int, help="How many gears to build at once. Defaults to one per core")
+    args = parser.parse_args()
+
+    sweep = {}
+    for name, valueType, default in PARAMETERS:
+        try:
+            sweep[name] = [value for text in getattr(args, name) for value in parseValues(text, valueType)]
+        except ValueError as e:
+            parser.error("--%s: %s" % (name, e))
+
+    built, skipped = farm(sweep, args.out, fileFormat=args.format, jobs=args.jobs)
+    print("Built %s gears, skipped %s that already existed" % (built, skipped))
+
+
+def parseValues(text, valueType=float):
+    """
+    Turns a value from the command line into a list of values.
+    Args:
+        text: A single number like 10, or an inclusive range like 5:30 or 0.2:0.6:0.1
+        valueType: The type of the values, int or float
+
+    Returns:
+        list: The values
+    """
+    parts = [valueType(part) for part in text.split(':')]
+    if len(parts) == 1:
+        return parts
+    if len(parts) > 3:
+        raise ValueError("%s should be a value, start:stop or start:stop:step" % text)
+
+    start, stop = parts[:2]
+    step = parts[2] if len(parts) == 3 else valueType(1)
+    if step <= 0:
+        raise ValueError("The step of %s must be more than 0" % text)
+
+    # We count the steps rather than adding the step over and over, so floats don't drift away from the values asked
+    # for, and round the last one so that 0.2:0.6:0.1 still includes 0.6.
+    count = int(round((stop - start) / float(step), 9)) + 1
+    return [valueType(round(start + index * step, 9)) for index in range(max(count, 0))]
+
+
+def iterVariants(sweep):
+    """
+    Gives back every combination of the swept values.
+    Args:
+        sweep: A dictionary of GearMesh argument to a list of values. Missing arguments use the values in PARAMETERS.
+
+    Returns:
+        generator: A dictionary of GearMesh arguments for each variant
+    """
+    names = [name for name, valueType, default in PARAMETERS]
+    values = [sweep.get(name) or default for name, valueType, default in PARAMETERS]
+    for combination in itertools.product(*values):
+        yield dict(zip(names, combination))
+
+
+def getHash(params, fileFormat):
+    """
+    Gives back a hash of everything that decides what a variant's file contains.
+    Two variants with the same hash would write exactly the same file, so we only ever need to build one of them.
+    """
+    content = json.dumps({"params": params, "format": fileFormat}, sort_keys=True)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def farm(sweep, outDirectory, fileFormat="obj", jobs=None):
+    """
+    Builds every variant of a parameter sweep in a pool of processes, skipping the ones that were already built.
+    Args:
+        sweep: A dictionary of GearMesh argument to a list of values
+        outDirectory: The directory to write the gears and manifest to. It is made if it doesn't exist.
+        fileFormat: A key from FORMATS
+        jobs: How many gears to build at once. Defaults to one per core.
+
+    Returns:
+        tuple: How many variants were built and how many were skipped. A variant asked for twice only counts once.
+    """
+    if fileFormat not in FORMATS:
+        raise ValueError("%s is not one of %s" % (fileFormat, ", ".join(sorted(FORMATS))))
+
+    if not os.path.isdir(outDirectory):
+        os.makedirs(outDirectory)
+
+    manifest = readManifest(outDirectory)
+    extension = FORMATS[fileFormat][0]
+
+    tasks = []
+    skipped = 0
+    # A sweep can ask for the same variant more than once, like --teeth 5:10 8:12 does for 8, 9 and 10.
+    # Each one is only built once, or two processes would be writing the same file at the same time.
+    queued = set()
+    for params in iterVariants(sweep):
+        variantHash = getHash(params, fileFormat)
+        if variantHash in queued:
+            continue
+        queued.add(variantHash)
+
+        # A variant is only skipped if the manifest knows about it and its file is still there.
+        entry = manifest.get(variantHash)
+        if entry and os.path.exists(os.path.join(outDirectory, entry["file"])):
+            skipped += 1
+            continue
+
+        fileName = "gear_%s%s" % (variantHash[:16], extension)
+        manifest[variantHash] = {"file": fileName, "format": fileFormat, "params": params}
+        tasks.append((params, os.path.join(outDirectory, fileName), fileFormat))
+
+    try:
+        # Each gear is small, so we hand the processes a few at a time to keep them from waiting on us.
+        with futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            chunksize = max(1, len(tasks) // ((jobs or os.cpu_count() or 1) * 4))
+            list(pool.map(buildVariant, tasks, chunksize=chunksize))
+    except Exception:
+        # Only list the variants that made it to disk, so the next run builds the rest.
+        manifest = dict((key, entry) for key, entry in manifest.items()
+                        if os.path.exists(os.path.join(outDirectory, entry["file"])))
+        raise
+    finally:
+        writeManifest(outDirectory, manifest)
+
+    return len(tasks), skipped
+
+
+def buildVariant(task):
+    """
+    Builds a single gear and writes it to disk. This is run inside one of the pool's processes.
+    Args:
+        task: A tuple of the GearMesh arguments, the path to write to and a key from FORMATS
+
+    Returns:
+        str: The path that was written
+    """
+    params, path, fileFormat = task
+    mesh = GearMesh(**params)
+
+    # We write to a temporary file and then swap it into place, so a half written gear never looks finished.
+    temp = path + '.building'
+    try:
+        getattr(mesh, FORMATS[fileFormat][1])(temp)
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+    return path
+
+
+def readManifest(outDirectory):
+    """
+    Reads the manifest of an output directory.
+    Returns:
+        dict: A dictionary of variant hash to its file name, format and parameters. Empty if there's no manifest yet.
+    """
+    path = os.path.join(outDirectory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def writeManifest(outDirectory, manifest):
+    """
+    Writes the manifest of an output directory, swapping it into place so it's never left half written.
+    """
+    path = os.path.join(outDirectory, MANIFEST_NAME)
+    temp = path + '.writing'
+    with open(temp, 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(temp, path)
+
+
+# If our namespace is main, run main().
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+import struct
+
+# NumPy lets us work out every vertex and face of the gear at once, instead of one at a time.
+import numpy
+
+# We only need Maya to turn the gear into a mesh in a scene. Everything else works anywhere Python does.
+try:
+    import maya.api.OpenMaya as om
+except ImportError:
+    om = None
+
+# The first bytes of a buffer file, and the layout of the header that follows them.
+BUFFER_MAGIC = b'GEAR'
+BUFFER_HEADER = struct.Struct('<4sII')
+
+
+class GearMesh(object):
+    """
+    Works out the vertices, faces and UVs of a gear with NumPy, without Maya or any construction history.
+    The gear is a pipe with a tooth sticking out of every other face around its outside, just like the ones
+    gearClassCreator.Gear makes with polyPipe and polyExtrudeFacet. It stands upright along Y, centred on the origin.
+
+    Example of use:
+        mesh = GearMesh(teeth=12, length=0.4)
+        mesh.writeObj('gear.obj')
+
+        # Inside Maya, this builds the mesh in the scene.
+        mesh.createMesh()
+    """
+
+    def __init__(self, teeth=10, length=0.3, radius=1.0, height=2.0, thickness=0.5, bevel=0.0):
+        """
+        Args:
+            teeth: The number of teeth
+            length: How far the teeth stick out
+            radius: The radius of the outside of the pipe, not counting the teeth
+            height: The height of the gear
+            thickness: How far it is from the inside of the pipe to the outside
+            bevel: How much narrower the tip of each tooth is than its base, from 0 for square teeth up to,
+                   but not including, 1 for pointed teeth
+        """
+        if teeth < 3:
+            raise ValueError("A gear needs at least 3 teeth, not %s" % teeth)
+        if not 0 < thickness < radius:
+            raise ValueError("The thickness must be more than 0 and less than the radius")
+        if not 0 <= bevel < 1:
+            raise ValueError("The bevel must be at least 0 and less than 1")
+
+        self.teeth = teeth
+        self.length = length
+        self.radius = radius
+        self.height = height
+        self.thickness = thickness
+        self.bevel = bevel
+
+        self.vertices, self.faces = self.build()
+        self.uvs = self.buildUVs()
+
+    def build(self):
+        """
+        Works out the vertices and faces.
+
+        There are four rings of vertices around the pipe, the outside and inside at the bottom and the top.
+        Then each tooth adds four more vertices at its tip.
+        Every face has four vertices, so the faces are one array of four vertex indices each.
+        The vertices of each face go anticlockwise when seen from outside the gear, so the normals point out.
+
+        Returns:
+            tuple: A (vertex count, 3) array of positions and a (face count, 4) array of vertex indices
+        """
+        # Teeth are every alternate face, so spans x 2
+        spans = self.teeth * 2
+        segment = 2 * numpy.pi / spans
+        angles = numpy.arange(spans) * segment
+
+        innerRadius = self.radius - self.thickness
+        bottom = -self.height / 2.0
+        top = self.height / 2.0
+
+        rings = [
+            ring(angles, self.radius, bottom),
+            ring(angles, self.radius, top),
+            ring(angles, innerRadius, bottom),
+            ring(angles, innerRadius, top),
+        ]
+
+        # The tips of the teeth are narrowed towards the middle of their face by the bevel.
+        toothAngles = angles[0::2]
+        halfTip = segment / 2.0 * (1 - self.bevel)
+        tipRadius = self.radius + self.length
+        tipStarts = toothAngles + segment / 2.0 - halfTip
+        tipEnds = toothAngles + segment / 2.0 + halfTip
+        rings += [
+            ring(tipStarts, tipRadius, bottom),
+            ring(tipEnds, tipRadius, bottom),
+            ring(tipStarts, tipRadius, top),
+            ring(tipEnds, tipRadius, top),
+        ]
+
+        vertices = numpy.concatenate(rings)
+
+        # These are the index of the first vertex of each ring, so ring + i is the i'th vertex of that ring.
+        outerBottom, outerTop, innerBottom, innerTop = [index * spans for index in range(4)]
+        tipStartBottom, tipEndBottom, tipStartTop, tipEndTop = [4 * spans + index * self.teeth for index in range(4)]
+
+        here = numpy.arange(spans)
+        after = (here + 1) % spans
+        tooth = numpy.arange(self.teeth)
+        toothHere = here[0::2]
+        toothAfter = after[0::2]
+        gapHere = here[1::2]
+        gapAfter = after[1::2]
+
+        faces = numpy.concatenate([
+            # The top and bottom of the pipe.
+            numpy.stack([outerTop + here, outerTop + after, innerTop + after, innerTop + here], axis=1),
+            numpy.stack([outerBottom + here, innerBottom + here, innerBottom + after, outerBottom + after], axis=1),
+            # The inside of the pipe.
+            numpy.stack([innerBottom + here, innerTop + here, innerTop + after, innerBottom + after], axis=1),
+            # The outside of the pipe between the teeth.
+            numpy.stack([outerBottom + gapHere, outerBottom + gapAfter, outerTop + gapAfter, outerTop + gapHere],
+                        axis=1),
+            # The tips of the teeth.
+            numpy.stack([tipStartBottom + tooth, tipEndBottom + tooth, tipEndTop + tooth, tipStartTop + tooth],
+                        axis=1),
+            # The tops and bottoms of the teeth.
+            numpy.stack([outerTop + toothHere, tipStartTop + tooth, tipEndTop + tooth, outerTop + toothAfter],
+                        axis=1),
+            numpy.stack([outerBottom + toothHere, outerBottom + toothAfter, tipEndBottom + tooth,
+                         tipStartBottom + tooth], axis=1),
+            # The two sides of each tooth.
+            numpy.stack([outerBottom + toothHere, tipStartBottom + tooth, tipStartTop + tooth, outerTop + toothHere],
+                        axis=1),
+            numpy.stack([outerBottom + toothAfter, outerTop + toothAfter, tipEndTop + tooth, tipEndBottom + tooth],
+                        axis=1),
+        ])
+
+        return vertices, faces.astype(numpy.int32)
+
+    def buildUVs(self):
+        """
+        Works out a UV for each vertex, by projecting the gear down from above into the 0 to 1 square.
+        Returns:
+            A (vertex count, 2) array of UVs
+        """
+        extent = 2.0 * (self.radius + max(self.length, 0))
+        return self.vertices[:, [0, 2]] / extent + 0.5
+
+    def writeObj(self, path):
+        """
+        Writes the gear to a Wavefront OBJ file.
+        Args:
+            path: The file to write
+        """
+        # OBJ files count from 1, and each vertex has a UV with the same index.
+        faces = self.faces + 1
+        with open(path, 'w') as f:
+            f.write('# gear teeth=%s length=%s radius=%s height=%s thickness=%s bevel=%s\n' %
+                    (self.teeth, self.length, self.radius, self.height, self.thickness, self.bevel))
+            f.write(''.join('v %r %r %r\n' % tuple(vertex) for vertex in self.vertices.tolist()))
+            f.write(''.join('vt %r %r\n' % tuple(uv) for uv in self.uvs.tolist()))
+            f.write(''.join('f %d/%d %d/%d %d/%d %d/%d\n' % (a, a, b, b, c, c, d, d)
+                            for a, b, c, d in faces.tolist()))
+
+    def writeBuffer(self, path):
+        """
+        Writes the gear as raw little endian arrays, for tools that want to load it straight into memory.
+        After a header of the magic bytes, the vertex count and the face count, come the vertices as float32 x, y, z,
+        the faces as four int32 vertex indices and the UVs as float32 u, v.
+        Args:
+            path: The file to write
+        """
+        with open(path, 'wb') as f:
+            f.write(BUFFER_HEADER.pack(BUFFER_MAGIC, len(self.vertices), len(self.faces)))
+            f.write(self.vertices.astype('<f4').tobytes())
+            f.write(self.faces.astype('<i4').tobytes())
+            f.write(self.uvs.astype('<f4').tobytes())
+
+    @staticmethod
+    def readBuffer(path):
+        """
+        Reads the arrays back out of a file written by writeBuffer.
+        Args:
+            path: The file to read
+
+        Returns:
+            tuple: The vertices, faces and UVs arrays
+        """
+        with open(path, 'rb') as f:
+            magic, vertexCount, faceCount = BUFFER_HEADER.unpack(f.read(BUFFER_HEADER.size))
+            if magic != BUFFER_MAGIC:
+                raise IOError("%s is not a gear buffer" % path)
+
+            vertices = numpy.frombuffer(f.read(vertexCount * 12), dtype='<f4').reshape(vertexCount, 3)
+            faces = numpy.frombuffer(f.read(faceCount * 16), dtype='<i4').reshape(faceCount, 4)
+            uvs = numpy.frombuffer(f.read(vertexCount * 8), dtype='<f4').reshape(vertexCount, 2)
+
+        return vertices, faces, uvs
+
+    def createMesh(self, parent=None):
+        """
+        Builds the gear as a mesh in the Maya scene, with one call to MFnMesh.create and no construction history.
+        The mesh is put in the default shading group, so it renders and draws shaded like any other mesh.
+        Args:
+            parent: The MObject of the transform to put the mesh under. Defaults to making a new one.
+
+        Returns:
+            str: The name of the transform the mesh is under
+        """
+        if om is None:
+            raise RuntimeError("Maya is needed to create a mesh in a scene")
+
+        vertices = [om.MPoint(*vertex) for vertex in self.vertices.tolist()]
+        polygonCounts = [4] * len(self.faces)
+        polygonConnects = self.faces.ravel().tolist()
+
+        mesh = om.MFnMesh()
+        transform = mesh.create(vertices, polygonCounts, polygonConnects,
+                                self.uvs[:, 0].tolist(), self.uvs[:, 1].tolist(),
+                                parent=parent if parent is not None else om.MObject.kNullObj)
+
+        # Each vertex has the UV with the same index, so the UV of each face corner is the same as its vertex.
+        mesh.assignUVs(polygonCounts, polygonConnects)
+
+        # Meshes made through the API aren't in a shading group, so they'd show up green.
+        # We put the new one in the default shading group, the same as polyPipe would.
+        shadingGroups = om.MSelectionList()
+        shadingGroups.add('initialShadingGroup')
+        om.MFnSet(shadingGroups.getDependNode(0)).addMember(om.MDagPath.getAPathTo(mesh.object()))
+
+        return om.MFnDagNode(transform).partialPathName()
+
+
+def ring(angles, radius, y):
+    """
+    Gives back the positions of points on a circle around Y.
+    Args:
+        angles: An array of angles in radians, going anticlockwise when seen from above
+        radius: The radius of the circle
+        y: The height of the circle
+
+    Returns:
+        An (angle count, 3) array of positions
+    """
+    return numpy.stack([radius * numpy.cos(angles), numpy.full(len(angles), float(y)),
+                        -radius * numpy.sin(angles)], axis=1)
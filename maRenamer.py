@@ -0,0 +1,401 @@
+import argparse
+import os
+import re
+
+# The concurrent.futures module gives us a pool of processes, so we can rename many files at the same time.
+from concurrent import futures
+
+# We share the suffix rules with objectRenamer, but we never import Maya, so this runs anywhere Python does.
+from suffixes import SUFFIXES, DEFAULT_SUFFIX
+
+# Without Maya we can't ask which types a type inherits from, so here are the parents of the common ones.
+# getSuffix follows these until it finds a type that has a suffix, just like objectRenamer does with Maya's help.
+PARENT_TYPES = {
+    "ambientLight" : "light",
+    "areaLight" : "light",
+    "directionalLight" : "light",
+    "pointLight" : "light",
+    "spotLight" : "light",
+    "volumeLight" : "light",
+    "joint" : "transform",
+}
+
+# These types are always in the DAG, even when they're at the top of the hierarchy with no children.
+# Anything with a parent or children is in the DAG too, whatever its type.
+DAG_TYPES = set(["transform", "joint", "mesh", "nurbsCurve", "nurbsSurface", "camera", "locator", "light",
+                 "ikHandle", "lattice", "baseLattice", "clusterHandle", "follicle"]) | set(PARENT_TYPES)
+
+# A quoted string in a .ma file, which may have escaped quotes inside it.
+QUOTED = r'"((?:[^"\\]|\\.)*)"'
+QUOTED_STRING = re.compile(QUOTED)
+CREATE_NODE = re.compile(r'^\s*createNode\s+(\S+)')
+NAME_FLAG = re.compile(r'(\s-n\s+)' + QUOTED)
+PARENT_FLAG = re.compile(r'(\s-p\s+)' + QUOTED)
+SELECT_NAME = re.compile(r'(\s)([^\s";-][^\s";]*)(\s*;)')
+
+# These are the commands whose quoted strings name nodes, and how many of their quoted strings to look at.
+# None means all of them. setAttr only names a node in its first string, the rest are values.
+# relationship starts with the kind of relationship, which we skip over.
+NODE_COMMANDS = {
+    "setAttr" : (0, 1),
+    "connectAttr" : (0, 2),
+    "disconnectAttr" : (0, 2),
+    "parent" : (0, None),
+    "relationship" : (1, None),
+}
+
+
+def main():
+    """
+    Renames the DAG objects in Maya ASCII files to have the correct suffix, without launching Maya.
+    Example of use:
+        python maRenamer.py scenes/*.ma --jobs 8 --out conformed
+    """
+    parser = argparse.ArgumentParser(description="Adds suffixes to the objects in Maya ASCII files without Maya")
+    parser.add_argument('files', nargs='+', help="The .ma files to rename objects in")
+    parser.add_argument('-o', '--out', help="The directory to write the files to. Defaults to changing them in place")
+    parser.add_argument('-j', '--jobs', type=int, help="How many files to work on at once. Defaults to one per core")
+    args = parser.parse_args()
+
+    if args.out and not os.path.isdir(args.out):
+        parser.error("%s does not exist" % args.out)
+
+    for path, count in renameFiles(args.files, outDirectory=args.out, jobs=args.jobs):
+        print("%s: renamed %s objects" % (path, count))
+
+
+def renameFiles(paths, outDirectory=None, jobs=None):
+    """
+    Renames the objects in many files at once, using a pool of processes.
+    Args:
+        paths: A list of .ma files
+        outDirectory: The directory to write the files to, or None to change them in place
+        jobs: How many files to work on at once. Defaults to one per core.
+
+    Returns:
+        list: A (path, number of objects renamed) tuple for each file
+    """
+    destinations = [os.path.join(outDirectory, os.path.basename(path)) if outDirectory else path for path in paths]
+
+    with futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(zip(paths, pool.map(renameFile, paths, destinations)))
+
+
+def renameFile(path, dest=None, rules=None):
+    """
+    Renames the objects in a single .ma file.
+
+    We read the file twice, a line at a time. We only keep the names and types of the objects in memory,
+    never the file itself, so big setAttr blocks of mesh data don't cost us anything.
+    The first time we only look at createNode lines, to learn the hierarchy and decide on the new names.
+    We have to do this first because a group's suffix depends on its children, which come after it in the file.
+    The second time we write every line back out, with the names swapped wherever a node is referred to.
+
+    Args:
+        path: The .ma file to read
+        dest: Where to write the renamed file. Defaults to writing over path.
+        rules: The Suffixer to use. Defaults to SUFFIXES and DEFAULT_SUFFIX.
+
+    Returns:
+        int: The number of objects that were renamed
+    """
+    dest = dest or path
+    rules = rules or Suffixer()
+
+    # surrogateescape lets any bytes that aren't valid text pass through untouched,
+    # and an empty newline keeps the line endings exactly as they were.
+    options = dict(encoding='utf-8', errors='surrogateescape', newline='')
+
+    scene = SceneNames()
+    with open(path, 'r', **options) as f:
+        for line in f:
+            match = CREATE_NODE.match(line)
+            if not match:
+                continue
+
+            name = NAME_FLAG.search(line)
+            parent = PARENT_FLAG.search(line)
+            if name:
+                scene.add(name.group(2), match.group(1), parent.group(2) if parent else None)
+
+    count = scene.decide(rules)
+
+    # We write to a temporary file next to the destination, and then swap it into place,
+    # so that if anything goes wrong the original file is left alone.
+    temp = dest + '.renaming'
+    try:
+        with open(path, 'r', **options) as f, open(temp, 'w', **options) as out:
+            for line in f:
+                out.write(scene.renameLine(line))
+        os.replace(temp, dest)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+    return count
+
+
+class Suffixer(object):
+    """
+    Works out the suffix for each node type, following PARENT_TYPES when a type has no rule of its own.
+    The answer for each type is remembered, so each type is only worked out once.
+    """
+
+    def __init__(self, suffixes=None, default=DEFAULT_SUFFIX, parents=None):
+        """
+        Args:
+            suffixes: A dictionary of node type to suffix. A suffix of None means the type is skipped.
+                      Defaults to SUFFIXES.
+            default: The suffix for any type that doesn't match a rule.
+            parents: A dictionary of node type to the type it inherits from. Defaults to PARENT_TYPES.
+        """
+        self.suffixes = SUFFIXES if suffixes is None else suffixes
+        self.default = default
+        self.parents = PARENT_TYPES if parents is None else parents
+        self.cache = {}
+
+    def getSuffix(self, nodeType):
+        """
+        Gives back the suffix for a node type, or None if it should be skipped.
+        """
+        if nodeType not in self.cache:
+            typeName = nodeType
+            suffix = self.default
+            while typeName:
+                if typeName in self.suffixes:
+                    suffix = self.suffixes[typeName]
+                    break
+                typeName = self.parents.get(typeName)
+
+            self.cache[nodeType] = suffix
+
+        return self.cache[nodeType]
+
+
+class SceneNames(object):
+    """
+    The hierarchy of a .ma file, and the new name of each object in it.
+    Objects are stored by their full path, like |grandparent|parent|child.
+    """
+
+    def __init__(self):
+        # These are in the same order as the createNode lines in the file.
+        self.paths = []
+        self.types = {}
+        self.children = {}
+        # A dictionary of short name to the full paths that end in it, so we can find what a name refers to.
+        self.byShortName = {}
+        # The full paths of the objects we rename, and their new short name.
+        self.newNames = {}
+        # A dictionary of short name after renaming to the full paths of the objects that will have it.
+        self.byNewShortName = {}
+        # When we write the file back out, this counts the createNode lines, so we know which object each one is.
+        self.created = 0
+
+    def add(self, name, nodeType, parent=None):
+        """
+        Adds an object from a createNode line.
+        Args:
+            name: The -n name of the object
+            nodeType: The type of the object
+            parent: The -p name of its parent, if it has one
+        """
+        parentPath = self.resolve(parent) if parent else None
+        path = "%s|%s" % (parentPath or "", name)
+
+        self.paths.append(path)
+        self.types[path] = nodeType
+        self.children.setdefault(path, [])
+        self.byShortName.setdefault(name, []).append(path)
+        if parentPath:
+            self.children[parentPath].append(path)
+
+    def resolve(self, token):
+        """
+        Finds the full path of an object from the way the file refers to it.
+        Maya writes the shortest name that is unique, so this could be a short name, part of a path or a full path.
+        Args:
+            token: The name as it appears in the file
+
+        Returns:
+            str: The full path, or None if it isn't one of our objects or we can't tell which one it is
+        """
+        if token.startswith("|"):
+            return token if token in self.types else None
+
+        candidates = self.byShortName.get(token.rsplit("|", 1)[-1], [])
+        if "|" in token:
+            candidates = [path for path in candidates if path.endswith("|" + token)]
+
+        return candidates[0] if len(candidates) == 1 else None
+
+    def decide(self, rules):
+        """
+        Decides on the new name of every object, with the same rules as objectRenamer.rename.
+        Args:
+            rules: The Suffixer to use
+
+        Returns:
+            int: How many objects will be renamed
+        """
+        for path in self.paths:
+            children = self.children[path]
+            nodeType = self.types[path]
+
+            # Only objects in the DAG get renamed, which is the same as what objectRenamer looks at.
+            if nodeType not in DAG_TYPES and not children and path.count("|") == 1:
+                continue
+
+            # If there's exactly one child, like a transform with a mesh under it, we go by the child's type.
+            if len(children) == 1:
+                nodeType = self.types[children[0]]
+
+            suffix = rules.getSuffix(nodeType)
+            if not suffix:
+                continue
+
+            parentPath, name = path.rsplit("|", 1)
+            if name.endswith("_" + suffix):
+                continue
+
+            # Maya would add a number to keep names unique, but without Maya we just leave these alone.
+            newName = "%s_%s" % (name, suffix)
+            if "%s|%s" % (parentPath, newName) in self.types:
+                continue
+
+            self.newNames[path] = newName
+
+        # The file only uses as much of a path as it needs to be unique, and a name that was unique may not be
+        # once everything is renamed. We keep every new short name, so we can tell when a name needs more of its path.
+        self.byNewShortName = {}
+        for path in self.paths:
+            newName = self.newNames.get(path, path.rsplit("|", 1)[1])
+            self.byNewShortName.setdefault(newName, []).append(path)
+
+        return len(self.newNames)
+
+    def renamePath(self, path, keep=None, absolute=False):
+        """
+        Gives back a path with every renamed object in it swapped for its new name.
+        If the names we keep would match more than one object after the renaming, we keep more of them until they
+        only match this one, or give back the full path.
+        Args:
+            path: The full path of an object
+            keep: How many names from the end of the path to give back, at least. Defaults to all of them.
+            absolute: Whether to start the path with a |
+
+        Returns:
+            str: The renamed path
+        """
+        parts = path.split("|")[1:]
+        newParts = []
+        for index, part in enumerate(parts):
+            prefix = "|" + "|".join(parts[:index + 1])
+            newParts.append(self.newNames.get(prefix, part))
+
+        if keep and not absolute:
+            while keep < len(newParts) and not self.isUnique(newParts[-keep:]):
+                keep += 1
+            # Even the whole path could be the end of a longer one, so only a path starting with a | is certain.
+            if keep >= len(newParts) and not self.isUnique(newParts):
+                absolute = True
+            newParts = newParts[-keep:]
+        return ("|" if absolute else "") + "|".join(newParts)
+
+    def isUnique(self, parts):
+        """
+        Checks whether the end of a path matches exactly one object, once everything has been renamed.
+        Args:
+            parts: The names at the end of the path, already renamed
+
+        Returns:
+            bool: True if only one object's renamed path ends with these names
+        """
+        candidates = self.byNewShortName.get(parts[-1], [])
+        if len(parts) == 1 or len(candidates) < 2:
+            return len(candidates) == 1
+
+        ending = "|" + "|".join(parts)
+        return sum(1 for path in candidates if self.renamePath(path, absolute=True).endswith(ending)) == 1
+
+    def renameToken(self, token):
+        """
+        Renames a quoted string that refers to an object, or one of its attributes, like pCube1.translateX
+        Args:
+            token: The string from the file
+
+        Returns:
+            str: The string with the object renamed, or exactly as it was if it isn't one of our renamed objects
+        """
+        node, dot, attribute = token.partition(".")
+        path = self.resolve(node) if node else None
+        if not path:
+            return token
+
+        newNode = self.renamePath(path, keep=len(node.strip("|").split("|")), absolute=node.startswith("|"))
+        return newNode + dot + attribute
+
+    def renameLine(self, line):
+        """
+        Gives back a line from the file with every reference to a renamed object swapped for its new name.
+        """
+        if not self.newNames:
+            return line
+
+        stripped = line.lstrip()
+        command = stripped.split(None, 1)[0] if stripped else None
+
+        if command == "createNode":
+            return self.renameCreateNode(line)
+
+        if command == "select":
+            return SELECT_NAME.sub(lambda match: match.group(1) + self.renameToken(match.group(2)) + match.group(3),
+                                   line)
+
+        if command not in NODE_COMMANDS:
+            return line
+
+        first, last = NODE_COMMANDS[command]
+        counter = [0]
+
+        def replace(match):
+            index = counter[0]
+            counter[0] += 1
+            if index < first or (last is not None and index >= last):
+                return match.group(0)
+
+            # Inside a createNode block, setAttr uses names that start with a dot, which belong to that node.
+            return '"%s"' % self.renameToken(match.group(1))
+
+        return QUOTED_STRING.sub(replace, line)
+
+    def renameCreateNode(self, line):
+        """
+        Renames the -n and -p of a createNode line.
+        We know exactly which object each createNode line is, because they're in the same order as the first read.
+        """
+        if not NAME_FLAG.search(line):
+            return line
+
+        path = self.paths[self.created]
+        self.created += 1
+
+        parentPath, name = path.rsplit("|", 1)
+        if path in self.newNames:
+            line = NAME_FLAG.sub(lambda match: '%s"%s"' % (match.group(1), self.newNames[path]), line, count=1)
+
+        def replaceParent(match):
+            token = match.group(2)
+            newParent = self.renamePath(parentPath, keep=len(token.strip("|").split("|")),
+                                        absolute=token.startswith("|"))
+            return '%s"%s"' % (match.group(1), newParent)
+
+        if parentPath:
+            line = PARENT_FLAG.sub(replaceParent, line, count=1)
+
+        return line
+
+
+# If our namespace is main, run main().
+if __name__ == '__main__':
+    main()
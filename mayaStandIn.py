@@ -0,0 +1,473 @@
+import collections
+import importlib
+import os
+import sys
+import types
+import uuid as uuidModule
+
+# The types each node type inherits from, starting from the most basic and ending with itself, like
+# cmds.nodeType(isTypeName=True, inherited=True) gives back. Anything missing here only inherits from itself.
+INHERITANCE = {
+    "transform": ["containerBase", "entity", "dagNode", "transform"],
+    "joint": ["containerBase", "entity", "dagNode", "transform", "joint"],
+    "mesh": ["containerBase", "entity", "dagNode", "shape", "geometryShape", "deformableShape",
+             "controlPoint", "surfaceShape", "mesh"],
+    "nurbsCurve": ["containerBase", "entity", "dagNode", "shape", "geometryShape", "deformableShape",
+                   "controlPoint", "curveShape", "nurbsCurve"],
+    "camera": ["containerBase", "entity", "dagNode", "shape", "camera"],
+    "spotLight": ["containerBase", "entity", "dagNode", "shape", "light", "renderLight", "nonAmbientLightShapeNode",
+                  "nonExtendedLightShapeNode", "spotLight"],
+}
+
+# The scene the stand in modules are working on. install() gives back a new one each time.
+scene = None
+
+
+def install():
+    """
+    Puts stand ins for maya.cmds and maya.api.OpenMaya in place of the real modules, with a new empty scene.
+    This lets the tools that need Maya be run and timed without it. Every call made into the stand ins is counted,
+    so we can check how many times a tool talks to Maya, and how that grows with the size of the scene.
+    The modules are only made once, so a tool that has already imported them carries on using the new scene.
+
+    Example of use:
+        scene = mayaStandIn.install()
+        scene.createNode("transform", "group1")
+        import objectRenamer
+        objectRenamer.rename()
+        print(scene.calls)
+
+    Returns:
+        Scene: The new scene
+    """
+    global scene
+    scene = Scene()
+
+    if not isinstance(sys.modules.get('maya.cmds'), StandInModule):
+        maya = StandInModule('maya')
+        maya.cmds = makeCmds()
+        maya.api = StandInModule('maya.api')
+        maya.api.OpenMaya = makeOpenMaya()
+        sys.modules.update({
+            'maya': maya,
+            'maya.cmds': maya.cmds,
+            'maya.api': maya.api,
+            'maya.api.OpenMaya': maya.api.OpenMaya,
+        })
+
+    return scene
+
+
+class StandInModule(types.ModuleType):
+    """
+    A module we've made ourselves, so install can tell its own modules from the real ones.
+    """
+
+
+class StandInNode(object):
+    """
+    A single node in the stand in scene.
+    A node can have more than one parent, which is how Maya instances objects.
+    """
+
+    def __init__(self, nodeType, name):
+        self.uuid = str(uuidModule.uuid4()).upper()
+        self.type = nodeType
+        self.name = name
+        self.parents = []
+        self.children = []
+
+
+class Scene(object):
+    """
+    A tiny in memory DAG for the stand in modules to work on, and a count of every call made into them.
+    """
+
+    def __init__(self):
+        self.nodes = collections.OrderedDict()
+        self.topNodes = []
+        self.selection = []
+        self.calls = collections.Counter()
+
+        # The plugins that are loaded, and the commands they've added.
+        self.plugins = set()
+        self.commands = {}
+
+        # Each step on the undo queue is a list of (undo, redo) functions. An open chunk collects them into one step.
+        self.undoQueue = []
+        self.redoQueue = []
+        self.chunk = None
+
+    def record(self, name):
+        self.calls[name] += 1
+
+    def addUndo(self, undo, redo):
+        """
+        Puts a change on the undo queue, or in the open chunk if there is one.
+        """
+        if self.chunk is not None:
+            self.chunk.append((undo, redo))
+        else:
+            self.undoQueue.append([(undo, redo)])
+        self.redoQueue = []
+
+    def setName(self, node, newName):
+        """
+        Renames a node. Like Maya, we add a number to the end if one of the node's siblings already has the name.
+        Returns:
+            str: The name the node was given
+        """
+        siblings = self.topNodes if not node.parents else [sibling for parent in node.parents
+                                                           for sibling in parent.children]
+        taken = set(sibling.name for sibling in siblings if sibling is not node)
+        name = newName
+        index = 1
+        while name in taken:
+            name = "%s%d" % (newName, index)
+            index += 1
+
+        node.name = name
+        return name
+
+    def createNode(self, nodeType, name, parent=None):
+        """
+        Adds a node to the scene.
+        Args:
+            nodeType: The type of the node
+            name: The short name of the node
+            parent: The StandInNode to put it under, or None to put it at the top
+
+        Returns:
+            StandInNode: The new node
+        """
+        node = StandInNode(nodeType, name)
+        self.nodes[node.uuid] = node
+        if parent:
+            self.parent(node, parent)
+        else:
+            self.topNodes.append(node)
+        return node
+
+    def parent(self, node, parent):
+        """
+        Adds another parent to a node. A node with more than one parent is instanced under each of them.
+        """
+        if node in self.topNodes:
+            self.topNodes.remove(node)
+        node.parents.append(parent)
+        parent.children.append(node)
+
+    def roots(self):
+        return list(self.topNodes)
+
+    def walk(self, nodes, prefix=""):
+        """
+        A generator that gives back the long name of every path to the nodes and their descendants, parents first.
+        Yields:
+            tuple: The long name and the StandInNode
+        """
+        for node in nodes:
+            path = "%s|%s" % (prefix, node.name)
+            yield path, node
+            for childPath, child in self.walk(node.children, path):
+                yield childPath, child
+
+    def find(self, path):
+        """
+        Gives back the node with a UUID, a long name, or a short name if it's unique.
+        """
+        if path in self.nodes:
+            return self.nodes[path]
+
+        if not path.startswith("|"):
+            matches = [node for node in self.nodes.values() if node.name == path]
+            if len(matches) == 1:
+                return matches[0]
+            raise ValueError("No unique object matches name: %s" % path)
+
+        # We follow a long name down from the top one part at a time, so finding a node doesn't walk the whole scene.
+        nodes = self.topNodes
+        node = None
+        for name in path.split("|")[1:]:
+            node = next((child for child in nodes if child.name == name), None)
+            if node is None:
+                raise ValueError("No object matches name: %s" % path)
+            nodes = node.children
+        return node
+
+    def longName(self, node):
+        """
+        Gives back the long name of a node's first path.
+        """
+        names = []
+        while node:
+            names.append(node.name)
+            node = node.parents[0] if node.parents else None
+        return "|" + "|".join(reversed(names))
+
+    def uniqueName(self, prefix):
+        """
+        Gives back the prefix with the lowest number on the end that no node has yet, like Maya names new nodes.
+        """
+        taken = set(node.name for node in self.nodes.values())
+        index = 1
+        while "%s%d" % (prefix, index) in taken:
+            index += 1
+        return "%s%d" % (prefix, index)
+
+    def paths(self):
+        return dict((node, path) for path, node in self.walk(self.roots()))
+
+
+def makeCmds():
+    """
+    Makes the stand in for maya.cmds. The commands we don't need to act out just count the call and give back None.
+    """
+    cmds = StandInModule('maya.cmds')
+
+    def ls(*args, **kwargs):
+        scene.record('cmds.ls')
+        if args and not kwargs.get('dag'):
+            # Objects we can't find are left out, rather than raising an error.
+            nodes = []
+            for name in args:
+                try:
+                    nodes.append(scene.find(name))
+                except ValueError:
+                    pass
+            if kwargs.get('uuid'):
+                return [node.uuid for node in nodes]
+            return [scene.longName(node) if kwargs.get('long') else node.name for node in nodes]
+
+        if not kwargs.get('dag'):
+            # Without dag, ls gives back every node once. We only keep the short names here.
+            return [node.name for node in scene.nodes.values()]
+
+        starts = scene.selection if kwargs.get('selection') else scene.roots()
+        if kwargs.get('selection'):
+            # Selected objects start from their own long name, so their parents' paths are kept.
+            paths = scene.paths()
+            listing = [(path, node) for start in starts
+                       for path, node in scene.walk([start], paths[start].rsplit("|", 1)[0])]
+        else:
+            listing = list(scene.walk(starts))
+
+        if kwargs.get('uuid'):
+            return [node.uuid for path, node in listing]
+
+        result = []
+        for path, node in listing:
+            result.append(path if kwargs.get('long') else node.name)
+            if kwargs.get('showType'):
+                result.append(node.type)
+        return result
+
+    def nodeType(name, isTypeName=False, inherited=False, **kwargs):
+        scene.record('cmds.nodeType')
+        nodeTypeName = name if isTypeName else scene.find(name).type
+        if inherited:
+            return list(INHERITANCE.get(nodeTypeName, [nodeTypeName]))
+        return nodeTypeName
+
+    def rename(path, newName):
+        scene.record('cmds.rename')
+        node = scene.find(path)
+        oldName = node.name
+        name = scene.setName(node, newName)
+        scene.addUndo(lambda: setattr(node, 'name', oldName), lambda: setattr(node, 'name', name))
+        return name
+
+    def createNode(nodeType, name=None, parent=None, **kwargs):
+        scene.record('cmds.createNode')
+        node = scene.createNode(nodeType, name or "%s1" % nodeType, parent=scene.find(parent) if parent else None)
+        return scene.setName(node, node.name)
+
+    def polyPipe(*args, **kwargs):
+        scene.record('cmds.polyPipe')
+        if kwargs.get('edit'):
+            return None
+
+        # The pipe's construction history isn't in the DAG, so we only need its name.
+        transform = scene.createNode('transform', scene.uniqueName('pPipe'))
+        scene.createNode('mesh', '%sShape' % transform.name, parent=transform)
+        return [transform.name, scene.uniqueName('polyPipe')]
+
+    def polyExtrudeFacet(*args, **kwargs):
+        scene.record('cmds.polyExtrudeFacet')
+        if kwargs.get('edit'):
+            return None
+        return [scene.uniqueName('polyExtrudeFace')]
+
+    def instance(name, **kwargs):
+        scene.record('cmds.instance')
+        # An instance is a new transform that shares the children of the original.
+        original = scene.find(name)
+        transform = scene.createNode(original.type, scene.uniqueName(original.name.rstrip('0123456789')))
+        for child in original.children:
+            scene.parent(child, transform)
+        return [transform.name]
+
+    def duplicate(name, **kwargs):
+        scene.record('cmds.duplicate')
+        original = scene.find(name)
+        transform = scene.createNode(original.type, scene.uniqueName(original.name.rstrip('0123456789')))
+        for child in original.children:
+            scene.createNode(child.type, '%sShape' % transform.name, parent=transform)
+        return [transform.name]
+
+    def file(*args, **kwargs):
+        scene.record('cmds.file')
+        if kwargs.get('new'):
+            install()
+
+    def undoInfo(**kwargs):
+        scene.record('cmds.undoInfo')
+        if kwargs.get('openChunk'):
+            scene.chunk = []
+        elif kwargs.get('closeChunk'):
+            chunk, scene.chunk = scene.chunk, None
+            if chunk:
+                scene.undoQueue.append(chunk)
+
+    def undo(**kwargs):
+        scene.record('cmds.undo')
+        if scene.undoQueue:
+            step = scene.undoQueue.pop()
+            for undoIt, redoIt in reversed(step):
+                undoIt()
+            scene.redoQueue.append(step)
+
+    def redo(**kwargs):
+        scene.record('cmds.redo')
+        if scene.redoQueue:
+            step = scene.redoQueue.pop()
+            for undoIt, redoIt in step:
+                redoIt()
+            scene.undoQueue.append(step)
+
+    def pluginInfo(name, query=False, loaded=False, **kwargs):
+        scene.record('cmds.pluginInfo')
+        return name in scene.plugins
+
+    def loadPlugin(path, **kwargs):
+        scene.record('cmds.loadPlugin')
+        # Plugins written in Python are modules with an initializePlugin function, which adds their commands.
+        name = os.path.splitext(os.path.basename(path))[0]
+        sys.path.insert(0, os.path.dirname(path))
+        try:
+            module = importlib.import_module(name)
+        finally:
+            sys.path.pop(0)
+        module.initializePlugin(sys.modules['maya.api.OpenMaya'].MObject())
+        scene.plugins.add(name)
+        return [name]
+
+    def select(*nodes, **kwargs):
+        scene.record('cmds.select')
+        scene.selection = [scene.find(node) if isinstance(node, str) else node for node in nodes]
+
+    def getCommand(name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name in scene.commands:
+            return scene.commands[name]
+
+        def command(*args, **kwargs):
+            scene.record('cmds.%s' % name)
+        return command
+
+    for function in (ls, nodeType, rename, createNode, polyPipe, polyExtrudeFacet, instance, duplicate, file, select,
+                     undoInfo, undo, redo, pluginInfo, loadPlugin):
+        setattr(cmds, function.__name__, function)
+    cmds.__getattr__ = getCommand
+    return cmds
+
+
+def makeOpenMaya():
+    """
+    Makes the stand in for maya.api.OpenMaya, with just the classes our tools use.
+    """
+    om = StandInModule('maya.api.OpenMaya')
+
+    class MObject(object):
+        def __init__(self, node=None):
+            self.node = node
+
+        def isNull(self):
+            return self.node is None
+
+    MObject.kNullObj = MObject()
+
+    class MUuid(object):
+        def __init__(self, value):
+            self.value = value
+
+    class MSelectionList(object):
+        def __init__(self):
+            self.nodes = []
+
+        def add(self, item):
+            scene.record('om.MSelectionList.add')
+            self.nodes.append(scene.nodes[item.value] if isinstance(item, MUuid) else scene.find(item))
+            return self
+
+        def getDependNode(self, index):
+            scene.record('om.MSelectionList.getDependNode')
+            return MObject(self.nodes[index])
+
+        def length(self):
+            return len(self.nodes)
+
+    class MFnDependencyNode(object):
+        def __init__(self, mObject=None):
+            self.node = mObject.node if mObject else None
+
+        def name(self):
+            scene.record('om.MFnDependencyNode.name')
+            return self.node.name
+
+    class MDagModifier(object):
+        def __init__(self):
+            self.renames = []
+            self.oldNames = []
+
+        def renameNode(self, mObject, newName):
+            scene.record('om.MDagModifier.renameNode')
+            self.renames.append((mObject.node, newName))
+
+        def doIt(self):
+            scene.record('om.MDagModifier.doIt')
+            self.oldNames = [(node, node.name) for node, newName in self.renames]
+            for node, newName in self.renames:
+                scene.setName(node, newName)
+
+        def undoIt(self):
+            scene.record('om.MDagModifier.undoIt')
+            for node, oldName in reversed(self.oldNames):
+                node.name = oldName
+
+    class MPxCommand(object):
+        def isUndoable(self):
+            return False
+
+    class MFnPlugin(object):
+        def __init__(self, mObject=None, vendor=None, version=None):
+            pass
+
+        def registerCommand(self, name, creator):
+            def command(*args, **kwargs):
+                scene.record('cmds.%s' % name)
+                instance = creator()
+                instance.doIt(args)
+                # Like Maya, only undoable commands are kept on the undo queue.
+                if instance.isUndoable():
+                    scene.addUndo(instance.undoIt, instance.redoIt)
+
+            scene.commands[name] = command
+
+        def deregisterCommand(self, name):
+            scene.commands.pop(name, None)
+
+    for cls in (MObject, MUuid, MSelectionList, MFnDependencyNode, MDagModifier, MPxCommand, MFnPlugin):
+        setattr(om, cls.__name__, cls)
+    return om
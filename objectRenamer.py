@@ -1,71 +1,514 @@
+import collections
+import re
 from maya import cmds
+# This is the Python 2.0 version of the Maya API. We use it to rename everything in one batch.
+import maya.api.OpenMaya as om
+import json
 
-# A dictionary with all the suffixes.
-SUFFIXES = {
-    "mesh" : "geo",
-    "joint" : "jnt",
-    "camera" : None,
-    "ambientLight" : "lgt"
-}
+# API changes don't go on Maya's undo queue by themselves, so we make them through undoableApi's command.
+import undoableApi
+
+# The suffix rules are shared with maRenamer, which has to work without Maya.
+from suffixes import SUFFIXES, DEFAULT_SUFFIX
 
-DEFAULT_SUFFIX = "grp"
+# The ways we can do the renaming. See applyRenamesCmds and applyRenamesApi.
+BACKENDS = ("cmds", "api")
+
+# Names that start with one of these are on that side of the character. Anything else is in the centre.
+SIDES = {
+    "L" : ("L_", "l_", "left_"),
+    "R" : ("R_", "r_", "right_"),
+    "C" : ("C_",)
+}
+CENTRE_SIDE = "C"
 
-def rename(selection=False) :
+def rename(selection=False, rules=None, backend="cmds", template=None) :
     # Doc string (what will be returned when someone calls 'help' on the rename function).
     """
     This function will rename any objects to have the correct suffix.
     Args:
         selection: Whether or not we use the current selection.
+        rules: The SuffixRules to use. Defaults to SUFFIXES and DEFAULT_SUFFIX.
+        backend: "cmds" to rename with cmds.rename, or "api" to rename everything with a single MDagModifier.
+        template: An optional template to build every name from, like "{side}_{base}_{index:03d}_{suffix}".
+                  See NameIndex.allocate for the fields. Without it, the suffix is just added to the end.
 
     Returns:
         A list of all the objects we operate on.
     """
-    objects = cmds.ls(selection=selection, dag=True, long=True)
+    if backend not in BACKENDS:
+        raise ValueError("%s is not a backend, use one of %s" % (backend, ", ".join(BACKENDS)))
+
+    if rules is None:
+        rules = SuffixRules()
+
+    # We ask Maya about the whole scene once, up front, instead of asking about every object inside the loop.
+    tree = DagTree.fromScene(selection=selection)
 
     # If the user sets selection to True and If there are no objects selected, raise an error.
-    if selection and not objects :
+    if selection and not tree :
         raise RuntimeError("You don't have anything selected!")
 
-    # Sort the objects by shortest to longest
-    objects.sort(key=len, reverse=True)
+    # Templates need to know every name in the scene, so they can pick names that are free.
+    names = NameIndex.fromScene() if template else None
+
+    objects = []
+    renames = []
+    # Instanced objects come up once for each of their paths, but they only need to be renamed once.
+    decided = set()
 
     # Loops and assigns a suffix to the objects in the outliner. Making sure to skip cameras.
-    for obj in objects:
-        # The name will be something like grandparent|parent|child
-        # We just want the child part of the name, so we split using the | character which gives us a list of
-        # ['grandparent', 'parent', 'child']
-        # We need to get the last item in the list, so we use [-1]. This means we go backwards through the list and
-        # pick the next item, which would therefore be the last item.
-        shortName = obj.split("|")[-1]
+    # We go bottom up, so every child is renamed before its parent.
+    # We only decide on the new names here, and then do all of the renaming together afterwards.
+    for node in tree.walk(topDown=False):
+        objects.append(node)
 
-        # Get the object type of children. If none, make it an empty list.
-        children = cmds.listRelatives(obj, children=True, fullPath=True) or []
+        if node.uuid in decided:
+            continue
+        decided.add(node.uuid)
 
-        if len(children) == 1:
-            child = children[0]
-            objType = cmds.objectType(child)
+        # Get the object type of children.
+        if len(node.children) == 1:
+            child = node.children[0]
+            objType = child.type
         else:
-            objType = cmds.objectType(obj)
+            objType = node.type
 
         # Depending on object type, give it a certain suffix name.
-        # If the dict donesn't have the suffix we are looking for, assume it is a group and return the "grp" suffix.
-        suffix = SUFFIXES.get(objType, DEFAULT_SUFFIX)
+        # If the rules don't have the suffix we are looking for, assume it is a group and return the "grp" suffix.
+        suffix = rules.getSuffix(objType)
 
         # If the suffix is not true (None), continue and skip the rest of the logic.
         if not suffix:
             continue
 
+        if template:
+            newName = names.allocate(template, node.name, suffix)
+            if newName == node.name:
+                continue
+
+            renames.append((node, newName))
+            continue
+
         # If suffix has already been added to an object, skip it.
-        if obj.endswith('_' + suffix) :
+        if node.name.endswith('_' + suffix) :
             continue
 
-        newName = "%s_%s" % (shortName, suffix)
-        # Rename objects to newName.
-        cmds.rename(obj, newName)
+        newName = "%s_%s" % (node.name, suffix)
+        renames.append((node, newName))
+
+    if backend == "api":
+        applyRenamesApi(tree, renames)
+    else:
+        applyRenamesCmds(tree, renames)
+
+    # The tree has kept every path up to date, so these are all still valid.
+    return [node.path for node in objects]
+
+
+def applyRenamesCmds(tree, renames):
+    """
+    Renames objects one at a time with cmds.rename.
+    All the renames are put in a single undo chunk, so one undo puts everything back.
+    Args:
+        tree: The DagTree the nodes belong to
+        renames: A list of (DagNode, newName) tuples
+    """
+    cmds.undoInfo(openChunk=True)
+    try:
+        for node, newName in renames:
+            # Rename objects to newName. Maya gives us back the name it actually used.
+            newName = cmds.rename(node.path, newName)
+
+            # Update the tree, which also fixes the path of every instance of this object and everything underneath it.
+            tree.rename(node.uuid, newName)
+    finally:
+        # We always close the chunk, even if something went wrong, or the undo queue would be left broken.
+        cmds.undoInfo(closeChunk=True)
+
+
+def applyRenamesApi(tree, renames):
+    """
+    Renames objects all at once with a single MDagModifier.
+    This skips the command engine for every rename, which is a lot faster on big scenes.
+    The modifier is run through undoableApi's command, so all the renames are a single step on Maya's undo queue.
+    Args:
+        tree: The DagTree the nodes belong to
+        renames: A list of (DagNode, newName) tuples
+
+    Returns:
+        om.MDagModifier: The modifier that did the renaming
+    """
+    modifier = om.MDagModifier()
+    if not renames:
+        return modifier
+
+    # We find every node by its UUID with a single selection list, so we don't have to look them up one at a time.
+    selectionList = om.MSelectionList()
+    for node, newName in renames:
+        selectionList.add(om.MUuid(node.uuid))
+
+    mObjects = []
+    for index, (node, newName) in enumerate(renames):
+        mObject = selectionList.getDependNode(index)
+        mObjects.append(mObject)
+        modifier.renameNode(mObject, newName)
+
+    # This is where all of the renaming actually happens, in one go.
+    undoableApi.run(modifier.doIt, modifier.undoIt)
+
+    # Maya may have changed some names to keep them unique, so we read back the names it actually used.
+    for (node, newName), mObject in zip(renames, mObjects):
+        tree.rename(node.uuid, om.MFnDependencyNode(mObject).name())
+
+    return modifier
+
+
+class SuffixRules(object) :
+    """
+    Works out the suffix for each node type, following the types it inherits from.
+    A spotLight inherits from light, so if there's no rule for spotLight, the rule for light is used.
+    The answer for each type is remembered, so we only ask Maya once per type no matter how many nodes there are.
+
+    Example of use:
+        rules = SuffixRules.fromFile('suffixes.json')
+        rules.getSuffix('spotLight')
+    """
+
+    def __init__(self, suffixes=None, default=DEFAULT_SUFFIX):
+        """
+        Args:
+            suffixes: A dictionary of node type to suffix. A suffix of None means the type is skipped.
+                      Defaults to SUFFIXES.
+            default: The suffix for any type that doesn't match a rule.
+        """
+        self.suffixes = dict(SUFFIXES if suffixes is None else suffixes)
+        self.default = default
+        self.cache = {}
+
+    @classmethod
+    def fromFile(cls, path):
+        """
+        Loads the rules from a JSON file that looks like:
+            {
+                "default": "grp",
+                "suffixes": {"mesh": "geo", "light": "lgt", "camera": null}
+            }
+        Args:
+            path: The path to the JSON file
+
+        Returns:
+            SuffixRules: The rules
+        """
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+        return cls(suffixes=data.get('suffixes', {}), default=data.get('default', DEFAULT_SUFFIX))
+
+    def getSuffix(self, nodeType):
+        """
+        Gives back the suffix for a node type.
+        Args:
+            nodeType: The type of the node
+
+        Returns:
+            The suffix, or None if this type should be skipped.
+        """
+        if nodeType in self.cache:
+            return self.cache[nodeType]
+
+        # Maya gives us every type this one inherits from, starting from the most basic and ending with itself.
+        # We go through it backwards so the most specific rule wins.
+        inherited = cmds.nodeType(nodeType, isTypeName=True, inherited=True) or [nodeType]
+
+        suffix = self.default
+        for typeName in reversed(inherited):
+            if typeName in self.suffixes:
+                suffix = self.suffixes[typeName]
+                break
+
+        self.cache[nodeType] = suffix
+        return suffix
+
+
+class NameIndex(object) :
+    """
+    An in memory count of every short name in the scene, so we can check if a name is free without asking Maya.
+    Short names don't have to be unique, as objects under different parents can share them,
+    so we count how many objects have each name rather than just remembering that it's used.
+    It hands out names from a template with a counter, so the same scene always gets the same names,
+    rather than whatever Maya's own numbering would have picked.
+    Every check is a single dictionary lookup, and each counter carries on from where it left off,
+    so handing out a name doesn't get slower as the scene gets bigger.
+
+    Example of use:
+        names = NameIndex.fromScene()
+        names.allocate("{side}_{base}_{index:03d}_{suffix}", "L_arm", "jnt")
+        # 'L_arm_001_jnt'
+    """
+
+    def __init__(self, names=()):
+        self.names = collections.Counter(names)
+        self.counters = {}
+
+    @classmethod
+    def fromScene(cls):
+        """
+        Builds the index from every node in the scene with a single query.
+        """
+        # ls can give us back long names where short names clash, so we only keep the last part.
+        return cls(name.split("|")[-1] for name in cmds.ls() or [])
+
+    def __contains__(self, name):
+        return self.names[name] > 0
+
+    def rename(self, oldName, newName):
+        """
+        Updates the index after something has been renamed.
+        """
+        self.release(oldName)
+        self.names[newName] += 1
+
+    def release(self, name):
+        """
+        Takes one object with this name out of the index. Anything else with the same name keeps it taken.
+        """
+        if self.names[name] > 1:
+            self.names[name] -= 1
+        else:
+            del self.names[name]
+
+    def allocate(self, template, name, suffix):
+        """
+        Works out a new name from a template, and adds it to the index.
+        The template can use these fields:
+            side: L, R or C, taken from the start of the current name. See SIDES.
+            base: The current name without its side, suffix or number.
+            suffix: The suffix for this type of object.
+            index: A number that makes the name unique. If the template doesn't have one and the name is taken,
+                   a number is added to the end instead.
+        Args:
+            template: The template, using str.format fields
+            name: The current short name of the object
+            suffix: The suffix to use
+
+        Returns:
+            str: The new name, which may be the same as the current name
+        """
+        side, base = splitName(name, suffix)
+
+        # The object's own name doesn't count as taken, so running this twice gives back the same names.
+        # It only stops counting once though, so the name stays taken if another object has it too.
+        self.release(name)
+
+        fields = dict(side=side, base=base, suffix=suffix)
+        hasIndex = "{index" in template
+
+        # Each combination of side, base and suffix gets its own counter.
+        key = (template, side, base, suffix)
+        index = self.counters.get(key, 1)
+        while True:
+            newName = template.format(index=index, **fields)
+            if not hasIndex and index > 1:
+                newName = "%s%d" % (newName, index - 1)
+
+            if newName not in self:
+                break
+            index += 1
+
+        # Next time, we carry on counting from here instead of starting at the beginning again.
+        self.counters[key] = index + 1
+        self.names[newName] += 1
+        return newName
+
+
+def splitName(name, suffix=None):
+    """
+    Splits a name into its side and base, dropping any suffix and number on the end.
+    For example L_arm_001_jnt gives back ("L", "arm").
+    Args:
+        name: The short name
+        suffix: The suffix to drop from the end, if it's there
+
+    Returns:
+        tuple: The side, and the base name
+    """
+    side = CENTRE_SIDE
+    for sideName, prefixes in SIDES.items():
+        prefix = next((prefix for prefix in prefixes if name.startswith(prefix)), None)
+        # We stop at the first side that matches, so L_r_foot is on the left, not the right.
+        if prefix:
+            side = sideName
+            name = name[len(prefix):]
+            break
+
+    if suffix and name.endswith("_" + suffix):
+        name = name[:-len(suffix) - 1]
+
+    # Drop a number on the end, like the _001 a template would have added.
+    name = re.sub(r"_[0-9]+$", "", name)
+
+    return side, name
+
+
+class DagNode(object) :
+    """
+    A single object in a DagTree.
+    """
+
+    def __init__(self, uuid, path, nodeType, parent=None):
+        self.uuid = uuid
+        self.path = path
+        self.type = nodeType
+        self.parent = parent
+        self.children = []
+
+    @property
+    def name(self):
+        # The path will be something like grandparent|parent|child
+        # We just want the child part of the name, so we split using the | character which gives us a list of
+        # ['grandparent', 'parent', 'child']
+        # We need to get the last item in the list, so we use [-1]. This means we go backwards through the list and
+        # pick the next item, which would therefore be the last item.
+        return self.path.split("|")[-1]
+
+
+class DagTree(object) :
+    """
+    An in memory copy of the DAG hierarchy, so we can rename objects without asking Maya where they are each time.
+    Every object is stored by its UUID, which doesn't change when it's renamed.
+    When an object is renamed, the paths of everything underneath it are updated as well.
+    Instanced objects share a UUID but have a node for each of their paths, so each path has its own parent and
+    children, and renaming the object updates all of them.
+
+    Example of use:
+        tree = DagTree.fromScene()
+        for node in tree.walk():
+            print(node.path, node.type)
+    """
+
+    def __init__(self):
+        # A dictionary of UUID to a list of the nodes for each of that object's paths.
+        self.nodes = {}
+        self.roots = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def fromScene(cls, selection=False):
+        """
+        Builds a tree from the scene using two queries, no matter how big the scene is.
+        Args:
+            selection: Whether or not we use the current selection.
+
+        Returns:
+            DagTree: The tree
+        """
+        # showType gives us back the type after each name, so the list looks like [name, type, name, type, ...]
+        listing = cmds.ls(selection=selection, dag=True, long=True, showType=True) or []
+        # Asking for the same list with uuid gives us each object's UUID in the same order.
+        uuids = cmds.ls(selection=selection, dag=True, long=True, uuid=True) or []
+
+        tree = cls()
+        # While we build the tree we also need to find each parent by its path.
+        # The parent of grandparent|parent|child is everything before the last | character.
+        # If we don't have the parent, for example because it isn't selected, it's the top of a hierarchy for us.
+        # Parents are always listed before their children, so they're in here by the time we need them.
+        byPath = {}
+
+        # Slicing with a step of 2 gives us every other item, so we can split the names from the types.
+        for uuid, path, nodeType in zip(uuids, listing[0::2], listing[1::2]):
+            parent = byPath.get(path.rsplit("|", 1)[0])
+            byPath[path] = tree.add(uuid, path, nodeType, parent=parent)
+
+        return tree
+
+    def add(self, uuid, path, nodeType, parent=None):
+        """
+        Adds a path of an object to the tree. An instanced object is added once for each of its paths.
+        Args:
+            uuid: The UUID of the object
+            path: The long name of the object
+            nodeType: The type of the object
+            parent: The DagNode of its parent, or None if it's at the top
+
+        Returns:
+            DagNode: The new node
+        """
+        node = DagNode(uuid, path, nodeType, parent=parent)
+        self.nodes.setdefault(uuid, []).append(node)
+        self.count += 1
+        if parent:
+            parent.children.append(node)
+        else:
+            self.roots.append(node)
+
+        return node
+
+    def get(self, uuid):
+        """
+        Gives back the node for the first path of the object with the given UUID, or None.
+        """
+        instances = self.nodes.get(uuid)
+        return instances[0] if instances else None
+
+    def getInstances(self, uuid):
+        """
+        Gives back the nodes for every path of the object with the given UUID.
+        """
+        return list(self.nodes.get(uuid, []))
+
+    def rename(self, uuid, newName):
+        """
+        Renames a node, and updates the paths of every instance of it and everything underneath them.
+        This only touches the node's paths and their descendants, no matter how big the tree is.
+        Args:
+            uuid: The UUID of the node to rename
+            newName: The new short name
+
+        Returns:
+            DagNode: The node for the first path of the renamed object
+        """
+        instances = self.nodes[uuid]
+        for node in instances:
+            node.path = "%s|%s" % (node.path.rsplit("|", 1)[0], newName)
+
+        # We use a list as a stack instead of calling ourselves, so very deep hierarchies don't hit Python's limit.
+        stack = list(instances)
+        while stack:
+            parent = stack.pop()
+            for child in parent.children:
+                child.path = "%s|%s" % (parent.path, child.name)
+                stack.append(child)
+
+        return instances[0]
+
+    def walk(self, topDown=True):
+        """
+        A generator that gives back every node in the tree.
+        Args:
+            topDown: Whether parents come before their children. If False, children come before their parents.
+
+        Yields:
+            DagNode: Each node in the tree
+        """
+        if topDown:
+            stack = list(reversed(self.roots))
+            while stack:
+                node = stack.pop()
+                yield node
+                stack.extend(reversed(node.children))
+            return
 
-        # Gives us back the index value of the object in the list.
-        index = objects.index(obj)
-        # Replace the object in the list with it's new name.
-        objects[index] = obj.replace(shortName, newName)
+        # For bottom up, we remember whether we've already gone into each node's children.
+        stack = [(node, False) for node in reversed(self.roots)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                yield node
+                continue
 
-    return objects
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
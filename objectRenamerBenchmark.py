@@ -0,0 +1,145 @@
+import argparse
+import json
+import sys
+import time
+
+# How many nodes each group in a synthetic scene adds, a group with a cube and a light under it.
+NODES_PER_GROUP = 5
+
+
+def main():
+    """
+    Times each objectRenamer backend on synthetic scenes and writes the results to a JSON file.
+    By default Maya is replaced with mayaStandIn, which also counts every call made into maya.cmds and OpenMaya.
+    Run it with mayapy and --maya to time the real thing.
+    Example of use:
+        python objectRenamerBenchmark.py --sizes 1000 10000
+        mayapy objectRenamerBenchmark.py --maya --sizes 1000 10000 --out maya.json
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks the objectRenamer backends on synthetic scenes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help="Roughly how many nodes to put in each scene")
+    parser.add_argument('--maya', action='store_true', help="Use Maya itself instead of the stand in")
+    parser.add_argument('-o', '--out', default='objectRenamerBenchmark.json', help="The JSON file to write results to")
+    args = parser.parse_args()
+
+    if args.maya:
+        import maya.standalone
+        maya.standalone.initialize()
+        # We check that each rename can be undone, so the undo queue has to be on.
+        from maya import cmds
+        cmds.undoInfo(state=True)
+    else:
+        import mayaStandIn
+        mayaStandIn.install()
+
+    results = runBenchmarks(args.sizes, standIn=not args.maya)
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=4)
+
+
+def runBenchmarks(sizes, standIn=True):
+    """
+    Times every backend on a scene of each size.
+    Args:
+        sizes: A list of roughly how many nodes to put in each scene
+        standIn: Whether we're using mayaStandIn, so we can report the calls made into Maya as well
+
+    Returns:
+        dict: Information about this run, with a list of results
+    """
+    # We only import objectRenamer now, so it picks up whichever Maya main set up.
+    import objectRenamer
+
+    results = []
+    for size in sizes:
+        for backend in objectRenamer.BACKENDS:
+            result = runBenchmark(size, backend, standIn=standIn)
+            results.append(result)
+            printResult(result)
+
+    return {
+        "maya": "stand in" if standIn else "maya",
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "results": results,
+    }
+
+
+def runBenchmark(size, backend, standIn=True):
+    """
+    Builds a new scene, then times renaming it with one backend and undoing the rename.
+    Args:
+        size: Roughly how many nodes to put in the scene
+        backend: A key from objectRenamer.BACKENDS
+        standIn: Whether we're using mayaStandIn
+
+    Returns:
+        dict: The result of this benchmark
+    """
+    import objectRenamer
+    from maya import cmds
+
+    cmds.file(new=True, force=True)
+    buildScene(size)
+    before = cmds.ls(dag=True, long=True)
+
+    if standIn:
+        import mayaStandIn
+        mayaStandIn.scene.calls.clear()
+
+    start = time.perf_counter()
+    objects = objectRenamer.rename(backend=backend)
+    seconds = time.perf_counter() - start
+
+    calls = dict(mayaStandIn.scene.calls) if standIn else None
+
+    # A single undo should put the whole scene back the way it was.
+    start = time.perf_counter()
+    cmds.undo()
+    undoSeconds = time.perf_counter() - start
+
+    return {
+        "size": size,
+        "backend": backend,
+        "objects": len(objects),
+        "seconds": seconds,
+        "objectsPerSecond": len(objects) / seconds if seconds else None,
+        "undoSeconds": undoSeconds,
+        "undoneInOneStep": cmds.ls(dag=True, long=True) == before,
+        "calls": calls,
+    }
+
+
+def buildScene(size):
+    """
+    Fills the scene with groups that each hold a cube and a light, which are a transform with a shape under it.
+    Args:
+        size: Roughly how many nodes to make
+    """
+    from maya import cmds
+
+    for index in range(max(size // NODES_PER_GROUP, 1)):
+        group = cmds.createNode('transform', name='group%d' % index)
+        cube = cmds.createNode('transform', name='pCube%d' % index, parent=group)
+        cmds.createNode('mesh', name='pCubeShape%d' % index, parent=cube)
+        light = cmds.createNode('transform', name='spotLight%d' % index, parent=group)
+        cmds.createNode('spotLight', name='spotLightShape%d' % index, parent=light)
+
+
+def printResult(result):
+    """
+    Prints a single result as one line.
+    """
+    line = "%(size)8d nodes  %(backend)-5s %(seconds)8.3fs  %(undoSeconds)8.3fs undo" % result
+    if not result["undoneInOneStep"]:
+        line += "  NOT UNDONE IN ONE STEP"
+    if result["calls"]:
+        line += "  " + ", ".join("%s=%d" % item for item in sorted(result["calls"].items()))
+    print(line)
+
+
+# If our namespace is main, run main().
+if __name__ == '__main__':
+    main()
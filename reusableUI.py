@@ -1,12 +1,16 @@
 from maya import cmds
-# Import the tween and gear functions
-from tweenerUI import tween
+# Import the live tween and gear classes
+from tweenerUI import LiveTween
 from gearClassCreator import Gear
 
 class BaseWindow( object ) :
 
     windowName = "BaseWindow"
 
+    def __init__(self) :
+        # The latest command and arguments waiting to run for each coalesced control, see coalesce.
+        self.pending = {}
+
     def show(self) :
 
         # If a window with the window name "Tweener Window" already exists, delete UI. This stops you from being able
@@ -21,6 +25,43 @@ class BaseWindow( object ) :
     def buildUI(self) :
         pass
 
+    def coalesce(self, command, key=None) :
+        """
+        Wraps a control's command so that it only runs once Maya is idle, with the latest value it was given.
+        Sliders call their dragCommand far more often than a heavy command can keep up with.
+        Instead of running every one in turn, we keep just the latest and drop the ones it replaced.
+        Example of use:
+            cmds.intSlider(dragCommand=self.coalesce(self.modifyGear))
+        Args:
+            command: The function the control should call
+            key: Commands with the same key replace each other's waiting calls. Defaults to the command itself,
+                 but giving a drag and a change command the same key means letting go replaces the last drag.
+
+        Returns:
+            A function to give to the control instead of the command
+        """
+        key = key or command
+
+        def schedule(*args) :
+            waiting = key in self.pending
+            self.pending[key] = (command, args)
+
+            # Only the first call since the last run asks Maya to run it. The later calls just replace the arguments.
+            if not waiting :
+                cmds.evalDeferred(lambda : self.runPending(key), lowestPriority=True)
+
+        return schedule
+
+    def runPending(self, key) :
+        """
+        Runs the latest waiting call for a key. This is what coalesce asks Maya to run when it's idle.
+        """
+        command, args = self.pending.pop(key, (None, None))
+
+        # If the window was closed while the call was waiting, its controls are gone, so there's nothing to update.
+        if command and cmds.window(self.windowName, query=True, exists=True) :
+            command(*args)
+
     # the *args parameter means that any extra arguments given to this function will be stored inside 'args'.
     def reset(self, *args) :
         pass
@@ -34,12 +75,20 @@ class TweenerUI(BaseWindow) :
     windowName = "TweenerWindow"
 
     def buildUI(self) :
+        self.liveTween = LiveTween()
+        # When the window is closed, however that happens, stop the live tween from watching the scene.
+        cmds.scriptJob(uiDeleted=[self.windowName, self.liveTween.stop])
+
         column = cmds.columnLayout()
         cmds.text(label="Use this slider to set the tween amount")
 
         row = cmds.rowLayout(numberOfColumns=2)
 
-        self.slider = cmds.floatSlider(min=0, max=100, value=50, step=1, changeCommand=tween)
+        # The slider tweens live while it's dragged, and sets the keys when it's let go.
+        # Both share a key, so letting go replaces a drag that hasn't run yet.
+        self.slider = cmds.floatSlider(min=0, max=100, value=50, step=1,
+                                       dragCommand=self.coalesce(self.liveTween.drag, key="tween"),
+                                       changeCommand=self.coalesce(self.liveTween.commit, key="tween"))
 
         cmds.button(label="Reset", command=self.reset)
 
@@ -55,6 +104,7 @@ class GearUI(BaseWindow) :
     windowName = "GearWindow"
 
     def __init__(self) :
+        BaseWindow.__init__(self)
         self.gear = None
 
     def buildUI(self):
@@ -64,7 +114,7 @@ class GearUI(BaseWindow) :
         cmds.rowLayout(numberOfColumns=4)
 
         self.label = cmds.text(label="10")
-        self.slider = cmds.intSlider(min=5, max=30, value=10, step=1, dragCommand=self.modifyGear)
+        self.slider = cmds.intSlider(min=5, max=30, value=10, step=1, dragCommand=self.coalesce(self.modifyGear))
 
         cmds.button(label="Make Gear", command=self.makeGear)
         cmds.button(label="Reset", command=self.reset)
@@ -0,0 +1,15 @@
+# These are the naming rules shared by objectRenamer and maRenamer.
+# They live in their own module so that maRenamer can use them without Maya.
+
+# A dictionary with all the suffixes.
+# Types also match anything that inherits from them, so "light" covers spotLight, pointLight and the rest.
+SUFFIXES = {
+    "mesh" : "geo",
+    "joint" : "jnt",
+    "camera" : None,
+    "ambientLight" : "lgt",
+    "light" : "lgt",
+    "nurbsCurve" : "crv"
+}
+
+DEFAULT_SUFFIX = "grp"
@@ -0,0 +1,61 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The stand in has to be installed before the gear tools import maya.
+import mayaStandIn
+mayaStandIn.install()
+import gearCreator
+import gearClassCreator
+
+
+# Making a gear and changing its teeth should take the same commands, however many teeth it has.
+EXPECTED_CALLS = {"cmds.polyPipe": 2, "cmds.polyExtrudeFacet": 2, "cmds.setAttr": 1}
+
+
+class TestGearCommands(unittest.TestCase):
+    """
+    Checks that building and changing a gear takes the same number of Maya commands, no matter how many teeth it has.
+    """
+
+    def test_createGear(self):
+        for teeth in (5, 30, 200):
+            scene = mayaStandIn.install()
+            transform, constructor, extrude = gearCreator.createGear(teeth=teeth)
+            gearCreator.changeTeeth(constructor, extrude, teeth=teeth * 2)
+            self.assertEqual(dict(scene.calls), EXPECTED_CALLS, teeth)
+
+    def test_gearClass(self):
+        for teeth in (5, 30, 200):
+            scene = mayaStandIn.install()
+            gear = gearClassCreator.Gear()
+            gear.createGear(teeth=teeth)
+            gear.changeTeeth(teeth=teeth * 2)
+            self.assertEqual(dict(scene.calls), EXPECTED_CALLS, teeth)
+
+    def test_cachedGearsAreCopied(self):
+        scene = mayaStandIn.install()
+        gearClassCreator.Gear.prototypes.clear()
+        for index in range(20):
+            gearClassCreator.Gear().createGear(teeth=12, cached=True, instance=True)
+
+        # Only the first gear is built. Every other one is an instance of it.
+        self.assertEqual(scene.calls["cmds.polyPipe"], 1)
+        self.assertEqual(scene.calls["cmds.polyExtrudeFacet"], 1)
+        self.assertEqual(scene.calls["cmds.instance"], 19)
+
+
+class TestSideFaces(unittest.TestCase):
+
+    def test_everyOtherFaceOfTheSide(self):
+        self.assertEqual(gearCreator.getSideFaces(3), ('f[12]', 'f[14]', 'f[16]'))
+        self.assertEqual(len(gearCreator.getSideFaces(200)), 200)
+
+    def test_remembered(self):
+        self.assertIs(gearCreator.getSideFaces(30), gearCreator.getSideFaces(30))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gearFarm
+
+
+class TestFarm(unittest.TestCase):
+    """
+    Checks that every variant of a sweep is built once, even when the sweep asks for it more than once.
+    """
+
+    def setUp(self):
+        self.out = tempfile.mkdtemp(prefix='gearFarmTest')
+
+    def tearDown(self):
+        shutil.rmtree(self.out)
+
+    def getFiles(self):
+        return sorted(name for name in os.listdir(self.out) if name != gearFarm.MANIFEST_NAME)
+
+    def test_repeatedValuesAreBuiltOnce(self):
+        built, skipped = gearFarm.farm({"teeth": [12] * 8}, self.out, jobs=4)
+        self.assertEqual((built, skipped), (1, 0))
+        self.assertEqual(len(self.getFiles()), 1)
+
+    def test_overlappingRanges(self):
+        teeth = gearFarm.parseValues("5:10", int) + gearFarm.parseValues("8:12", int)
+        built, skipped = gearFarm.farm({"teeth": teeth}, self.out, jobs=4)
+        self.assertEqual((built, skipped), (8, 0))
+        self.assertEqual(len(self.getFiles()), 8)
+        self.assertEqual(len(gearFarm.readManifest(self.out)), 8)
+
+        # Running it again finds every variant already built.
+        self.assertEqual(gearFarm.farm({"teeth": teeth}, self.out, jobs=4), (0, 8))
+
+
+if __name__ == '__main__':
+    unittest.main()
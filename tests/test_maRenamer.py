@@ -0,0 +1,74 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import maRenamer
+
+# |g1|a becomes a_geo, which is also the name of |g2|a_geo, so "a_geo" on its own would match both of them.
+CLASHING_SCENE = '''//Maya ASCII 2020 scene
+requires maya "2020";
+createNode transform -n "g1";
+createNode transform -n "a" -p "g1";
+createNode mesh -n "aShape" -p "a";
+createNode transform -n "g2";
+createNode transform -n "a_geo" -p "g2";
+createNode mesh -n "a_geoShape" -p "a_geo";
+setAttr "a.tx" 2;
+setAttr "a_geo.tx" 3;
+connectAttr "a.tx" "a_geo.ty";
+select -ne a_geo;
+'''
+
+
+class TestRenameFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='maRenamerTest')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def renameText(self, text):
+        path = os.path.join(self.directory, 'scene.ma')
+        with open(path, 'w') as f:
+            f.write(text)
+        maRenamer.renameFile(path)
+        with open(path, 'r') as f:
+            return f.read()
+
+    def test_clashingNamesGetLonger(self):
+        text = self.renameText(CLASHING_SCENE)
+
+        self.assertIn('createNode mesh -n "aShape_geo" -p "g1_grp|a_geo";', text)
+        self.assertIn('createNode mesh -n "a_geoShape_geo" -p "g2_grp|a_geo";', text)
+        self.assertIn('setAttr "g1_grp|a_geo.tx" 2;', text)
+        self.assertIn('setAttr "g2_grp|a_geo.tx" 3;', text)
+        self.assertIn('connectAttr "g1_grp|a_geo.tx" "g2_grp|a_geo.ty";', text)
+        self.assertIn('select -ne g2_grp|a_geo;', text)
+
+    def test_uniqueNamesStayShort(self):
+        text = self.renameText('createNode transform -n "a";\ncreateNode mesh -n "aShape" -p "a";\n'
+                               'setAttr "a.tx" 1;\n')
+        self.assertIn('createNode mesh -n "aShape_geo" -p "a_geo";', text)
+        self.assertIn('setAttr "a_geo.tx" 1;', text)
+
+
+class TestSceneNames(unittest.TestCase):
+
+    def test_wholePathIsAbsoluteWhenItCouldBeTheEndOfAnother(self):
+        scene = maRenamer.SceneNames()
+        scene.add("a", "transform")
+        scene.add("x", "transform")
+        scene.add("a", "transform", "x")
+        scene.decide(maRenamer.Suffixer())
+
+        self.assertEqual(scene.renamePath("|a", keep=1), "|a_grp")
+        self.assertEqual(scene.renamePath("|x|a", keep=1), "x_grp|a_grp")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The stand in has to be installed before objectRenamer imports maya.
+import mayaStandIn
+mayaStandIn.install()
+import objectRenamer
+from maya import cmds
+
+
+def buildScene(count):
+    """
+    Makes a new stand in scene with count groups, each holding a mesh and a light, and gives it back.
+    """
+    scene = mayaStandIn.install()
+    for index in range(count):
+        group = scene.createNode("transform", "group%d" % index)
+        cube = scene.createNode("transform", "pCube%d" % index, parent=group)
+        scene.createNode("mesh", "pCubeShape%d" % index, parent=cube)
+        light = scene.createNode("transform", "spotLight%d" % index, parent=group)
+        scene.createNode("spotLight", "spotLightShape%d" % index, parent=light)
+    return scene
+
+
+def queries(scene):
+    """
+    Gives back every call that asked Maya about the scene, leaving out the renames themselves and the undo chunk.
+    """
+    return dict((name, count) for name, count in scene.calls.items()
+                if name not in ("cmds.rename", "cmds.undoInfo"))
+
+
+class TestSceneQueries(unittest.TestCase):
+    """
+    Checks that renaming asks Maya about the scene the same number of times, no matter how big the scene is.
+    """
+
+    def test_queriesDontGrowWithScene(self):
+        counts = []
+        for count in (10, 1000):
+            scene = buildScene(count)
+            objectRenamer.rename()
+            counts.append(queries(scene))
+
+            # Every object gets a new name, with one cmds.rename each.
+            self.assertEqual(scene.calls["cmds.rename"], count * 5)
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(counts[0]["cmds.ls"], 2)
+
+    def test_templateQueriesDontGrowWithScene(self):
+        counts = []
+        for count in (10, 1000):
+            scene = buildScene(count)
+            objectRenamer.rename(template="{side}_{base}_{index:03d}_{suffix}")
+            counts.append(queries(scene))
+
+        self.assertEqual(counts[0], counts[1])
+        # One more ls than without a template, to find every name in the scene.
+        self.assertEqual(counts[0]["cmds.ls"], 3)
+
+    def test_renamesEverything(self):
+        scene = buildScene(1)
+        objects = objectRenamer.rename()
+
+        self.assertEqual(objects, [
+            "|group0_grp|pCube0_geo|pCubeShape0_geo",
+            "|group0_grp|pCube0_geo",
+            "|group0_grp|spotLight0_lgt|spotLightShape0_lgt",
+            "|group0_grp|spotLight0_lgt",
+            "|group0_grp",
+        ])
+        self.assertEqual(objects, cmdsLs())
+
+    def test_renameIsIdempotent(self):
+        scene = buildScene(3)
+        objectRenamer.rename()
+        scene.calls.clear()
+        objectRenamer.rename()
+        self.assertEqual(scene.calls["cmds.rename"], 0)
+
+
+class TestBackends(unittest.TestCase):
+    """
+    Checks that both backends give the same names, and that either one can be undone in a single step.
+    """
+
+    def test_backendsGiveTheSameNames(self):
+        names = []
+        for backend in objectRenamer.BACKENDS:
+            buildScene(5)
+            names.append(objectRenamer.rename(backend=backend))
+        self.assertEqual(names[0], names[1])
+
+    def test_apiRenamesWithOneModifier(self):
+        counts = []
+        for count in (10, 1000):
+            scene = buildScene(count)
+            objectRenamer.rename(backend="api")
+            counts.append(dict((name, number) for name, number in scene.calls.items()
+                               if name.startswith("cmds.") or name == "om.MDagModifier.doIt"))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertNotIn("cmds.rename", counts[0])
+        self.assertEqual(counts[0]["om.MDagModifier.doIt"], 1)
+
+    def test_undoPutsEverythingBack(self):
+        for backend in objectRenamer.BACKENDS:
+            buildScene(5)
+            before = cmdsLs()
+            after = objectRenamer.rename(backend=backend)
+
+            mayaStandIn.scene.calls.clear()
+            cmds.undo()
+            self.assertEqual(cmdsLs(), before, backend)
+
+            cmds.redo()
+            self.assertEqual(cmdsLs(), after, backend)
+
+
+class TestInstances(unittest.TestCase):
+    """
+    Checks that every path of an instanced object is renamed and given back.
+    """
+
+    def setUp(self):
+        # pCube2 under g2 is an instance of pCube1, sharing its shape.
+        self.scene = mayaStandIn.install()
+        g1 = self.scene.createNode("transform", "g1")
+        g2 = self.scene.createNode("transform", "g2")
+        cube = self.scene.createNode("transform", "pCube1", parent=g1)
+        shape = self.scene.createNode("mesh", "pCubeShape1", parent=cube)
+        instance = self.scene.createNode("transform", "pCube2", parent=g2)
+        self.scene.parent(shape, instance)
+
+    def test_instancesGetSuffixFromTheirOwnChildren(self):
+        objects = objectRenamer.rename()
+
+        self.assertIn("|g2_grp|pCube2_geo|pCubeShape1_geo", objects)
+        self.assertIn("|g1_grp|pCube1_geo|pCubeShape1_geo", objects)
+        self.assertEqual(sorted(objects), sorted(cmdsLs()))
+
+    def test_sharedShapeIsRenamedOnce(self):
+        objectRenamer.rename()
+        self.assertEqual(self.scene.calls["cmds.rename"], 5)
+
+    def test_treeKeepsEveryPath(self):
+        tree = objectRenamer.DagTree.fromScene()
+        self.assertEqual(len(tree), 6)
+
+        shape = tree.get(self.scene.find("|g1|pCube1|pCubeShape1").uuid)
+        paths = [node.path for node in tree.getInstances(shape.uuid)]
+        self.assertEqual(paths, ["|g1|pCube1|pCubeShape1", "|g2|pCube2|pCubeShape1"])
+
+        tree.rename(shape.uuid, "cubeShape")
+        paths = [node.path for node in tree.getInstances(shape.uuid)]
+        self.assertEqual(paths, ["|g1|pCube1|cubeShape", "|g2|pCube2|cubeShape"])
+
+
+class TestNames(unittest.TestCase):
+    """
+    Checks how names are split up and handed out from a template.
+    """
+
+    def test_splitNameStopsAtFirstSide(self):
+        self.assertEqual(objectRenamer.splitName("L_r_foot_jnt", "jnt"), ("L", "r_foot"))
+        self.assertEqual(objectRenamer.splitName("right_arm_002_jnt", "jnt"), ("R", "arm"))
+        self.assertEqual(objectRenamer.splitName("spine", "jnt"), ("C", "spine"))
+
+    def test_sharedNameStaysTaken(self):
+        # Two objects under different parents are both called arm, so the first one can't keep the name,
+        # as the other one still has it.
+        names = objectRenamer.NameIndex(["arm", "arm"])
+        self.assertEqual(names.allocate("{base}", "arm", "jnt"), "arm1")
+        self.assertIn("arm", names)
+        self.assertEqual(names.allocate("{base}", "arm", "jnt"), "arm2")
+        self.assertNotIn("arm", names)
+
+    def test_allocateIsIdempotent(self):
+        names = objectRenamer.NameIndex(["L_arm_001_jnt", "L_arm_002_jnt"])
+        template = "{side}_{base}_{index:03d}_{suffix}"
+        self.assertEqual(names.allocate(template, "L_arm_001_jnt", "jnt"), "L_arm_001_jnt")
+        self.assertEqual(names.allocate(template, "L_arm_002_jnt", "jnt"), "L_arm_002_jnt")
+
+    def test_renameReleasesOneName(self):
+        names = objectRenamer.NameIndex(["arm", "arm"])
+        names.rename("arm", "leg")
+        self.assertIn("arm", names)
+        names.rename("arm", "leg")
+        self.assertNotIn("arm", names)
+
+
+def cmdsLs():
+    """
+    Gives back every long name in the stand in scene, children first like objectRenamer.rename does.
+    """
+    tree = objectRenamer.DagTree.fromScene()
+    return [node.path for node in tree.walk(topDown=False)]
+
+
+if __name__ == '__main__':
+    unittest.main()
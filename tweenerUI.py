@@ -1,65 +1,602 @@
 from maya import cmds
+# These are the Python 2.0 versions of the Maya API. We use them to read whole animation curves at once.
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+# API changes don't go on Maya's undo queue by themselves, so we make them through undoableApi's command.
+import undoableApi
+# bisect lets us find where a time sits in a sorted list of key times without looking at every key.
+from bisect import bisect_left, bisect_right
+
+# NumPy lets us work out every channel's value in one go. Maya ships with it, but if it's missing we fall back
+# to plain Python lists, which give the same answer, just more slowly.
+try :
+    import numpy
+except ImportError :
+    numpy = None
 
 
 def tween(percentage, obj=None, attrs=None, selection=True) :
 
+    objs = getObjects(obj, selection)
+
+    # Get current frame.
+    currentTime = cmds.currentTime(query=True)
+
+    attrFulls, previousValues, nextValues = getNeighbours(objs, attrs, currentTime)
+    newValues = interpolate(previousValues, nextValues, percentage)
+
+    setKeys(dict(zip(attrFulls, newValues)), currentTime)
+
+
+def tweenRange(start, end, step=1, percentageCurve=None, obj=None, attrs=None, selection=True) :
+    """
+    Sets inbetween keys on every step frames from start to end, between the keys that are already there.
+    This is for going from blocking to spline, where we want a key on every frame.
+    The frames of each channel are all worked out together, and the keys of each curve are added in one go,
+    so we never have to move the timeline.
+    Frames that already have a key are left alone.
+    All of the new keys are a single step on Maya's undo queue.
+    Args:
+        start: The first frame
+        end: The last frame
+        step: How many frames apart the new keys should be
+        percentageCurve: How far to go from the previous key's value to the next key's value.
+                         This can be a number from 0 to 100, which is used for every frame,
+                         or a function that is given how far a frame is from the previous key to the next one,
+                         from 0 to 1, and gives back the percentage. When NumPy is available the function is given
+                         an array of them, so it should stick to arithmetic.
+                         Defaults to a straight line between the keys.
+        obj: The object or list of objects to tween. Defaults to the selection.
+        attrs: The attributes to tween. Defaults to all the keyable attributes of each object.
+        selection: Whether to use the selection if obj isn't given
+
+    Returns:
+        int: How many keys were set
+    """
+    if step <= 0 :
+        raise ValueError("The step must be more than 0.")
+
+    objs = getObjects(obj, selection)
+
+    frameCount = int((end - start) / float(step)) + 1
+    frames = [start + index * step for index in range(max(frameCount, 0))]
+
+    timeUnit = om.MTime.uiUnit()
+    # We work out every key first, so that all the command has to do is add them.
+    bakes = []
+    count = 0
+
+    for obj in objs :
+        objAttrs = attrs or cmds.listAttr(obj, keyable=True) or []
+
+        # We work in the API's own units here. Turning radians into degrees is just multiplying,
+        # so it doesn't change where the inbetweens land, and we can give the values straight back to the API.
+        for attrFull, curve, times, values in getChannels(obj, objAttrs, uiUnits=False) :
+            keyTimes, keyValues = getInbetweens(times, values, frames, percentageCurve)
+            if not keyTimes :
+                continue
+
+            bakes.append((curve, [om.MTime(keyTime, timeUnit) for keyTime in keyTimes], keyValues))
+            count += len(keyTimes)
+
+    if not bakes :
+        return 0
+
+    # The change remembers everything we add, so the command can undo and redo it.
+    change = oma.MAnimCurveChange()
+
+    # We don't rely on Maya telling the keyframe index about keys added through the API,
+    # so every time the keys are added or taken away we make it forget the curves ourselves.
+    def forgetBaked() :
+        for curve, keyTimes, keyValues in bakes :
+            keyIndex.forgetDriven(curve.object())
+
+    def bake() :
+        for curve, keyTimes, keyValues in bakes :
+            curve.addKeys(keyTimes, keyValues, keepExistingKeys=True, change=change)
+        forgetBaked()
+
+    def undo() :
+        change.undoIt()
+        forgetBaked()
+
+    def redo() :
+        change.redoIt()
+        forgetBaked()
+
+    undoableApi.run(bake, undo, redo)
+
+    return count
+
+
+def getInbetweens(times, values, frames, percentageCurve=None) :
+    """
+    Works out the inbetween values of a single channel on many frames at once.
+    Args:
+        times: The sorted key times
+        values: The key values, in the same order as the times
+        frames: The sorted frames to work out values on
+        percentageCurve: See tweenRange
+
+    Returns:
+        A tuple of the list of frames that are between two keys, and the list of their values.
+    """
+    if numpy is not None :
+        times = numpy.asarray(times, dtype=float)
+        values = numpy.asarray(values, dtype=float)
+        frames = numpy.asarray(frames, dtype=float)
+
+        # searchsorted is bisect for a whole array of frames at once.
+        previousIndices = numpy.searchsorted(times, frames, side='left') - 1
+        nextIndices = numpy.searchsorted(times, frames, side='right')
+
+        # A frame is between two keys if there's a key either side, and no key on the frame itself,
+        # in which case the previous and next keys are right next to each other.
+        between = (previousIndices >= 0) & (nextIndices < len(times)) & (nextIndices - previousIndices == 1)
+        frames = frames[between]
+        previousIndices = previousIndices[between]
+        nextIndices = nextIndices[between]
+
+        fractions = (frames - times[previousIndices]) / (times[nextIndices] - times[previousIndices])
+        percentages = getPercentages(percentageCurve, fractions)
+
+        previousValues = values[previousIndices]
+        newValues = previousValues + (values[nextIndices] - previousValues) * (percentages / 100.0)
+
+        return frames.tolist(), newValues.tolist()
+
+    keyTimes = []
+    keyValues = []
+    for frame in frames :
+        previousIndex = bisect_left(times, frame) - 1
+        nextIndex = bisect_right(times, frame)
+        if previousIndex < 0 or nextIndex >= len(times) or nextIndex - previousIndex != 1 :
+            continue
+
+        fraction = (frame - times[previousIndex]) / float(times[nextIndex] - times[previousIndex])
+        percentage = getPercentages(percentageCurve, fraction)
+
+        previousValue = values[previousIndex]
+        keyTimes.append(frame)
+        keyValues.append(previousValue + ((values[nextIndex] - previousValue) * percentage) / 100.0)
+
+    return keyTimes, keyValues
+
+
+def getPercentages(percentageCurve, fractions) :
+    """
+    Turns how far frames are between their keys into percentages, with a tweenRange percentageCurve.
+    fractions can be a single number or a NumPy array.
+    """
+    if percentageCurve is None :
+        return fractions * 100.0
+
+    if callable(percentageCurve) :
+        return percentageCurve(fractions)
+
+    return fractions * 0.0 + percentageCurve
+
+
+def getObjects(obj=None, selection=True) :
+    """
+    Gives back the objects to tween.
+    Args:
+        obj: An object or a list of objects
+        selection: Whether to use the selection if obj isn't given
+
+    Returns:
+        list: The objects to tween
+    """
     # If obj is not given and selection is set to False, error early.
     if not obj and not selection :
         raise ValueError("No object given to tween.")
 
-    # If no obj is specified, get it from the first selection.
+    # If no obj is specified, we tween everything that's selected.
     if not obj :
-        obj = cmds.ls(selection=True)[0]
-
-    if not attrs :
-        # List all the attributes on the object that are keyable.
-        attrs = cmds.listAttr(obj, keyable=True)
-
-    # Get current frame.
-    currentTime = cmds.currentTime(query=True)
-
+        objs = cmds.ls(selection=True)
+        if not objs :
+            raise ValueError("Nothing is selected to tween.")
+        return objs
+
+    # obj can be a single object or a list of them.
+    if isinstance(obj, (list, tuple)) :
+        return list(obj)
+
+    return [obj]
+
+
+def getNeighbours(objs, attrs, currentTime) :
+    """
+    Finds the keys either side of the current time, for every animated attribute on every object.
+    Args:
+        objs: The objects to look at
+        attrs: The attributes to look at. Defaults to all the keyable attributes of each object.
+        currentTime: The time to look either side of
+
+    Returns:
+        A tuple of three lists, the full attribute names, their previous key values and their next key values.
+        Attributes without a key on both sides are left out.
+    """
+    attrFulls = []
+    previousValues = []
+    nextValues = []
+
+    for obj in objs :
+        # The keyframe index remembers the curves of every object we've tweened before,
+        # so pressing tween again on the same objects doesn't have to look at the scene at all.
+        for attrFull, times, values in keyIndex.getChannels(obj, attrs) :
+            neighbours = findNeighbours(times, values, currentTime)
+
+            # If there isn't a keyframe both before and after the current frame, then continue.
+            if not neighbours :
+                continue
+
+            attrFulls.append(attrFull)
+            previousValues.append(neighbours[0])
+            nextValues.append(neighbours[1])
+
+    return attrFulls, previousValues, nextValues
+
+
+def interpolate(previousValues, nextValues, percentage) :
+    """
+    Works out the tweened value of every channel at once.
+    Args:
+        previousValues: The values of the keys before the current time
+        nextValues: The values of the keys after the current time, in the same order
+        percentage: How far to go from the previous value to the next one, from 0 to 100
+
+    Returns:
+        A list of the new values, in the same order
+    """
+    if numpy is not None :
+        previousArray = numpy.asarray(previousValues, dtype=float)
+        nextArray = numpy.asarray(nextValues, dtype=float)
+        return (previousArray + (nextArray - previousArray) * (percentage / 100.0)).tolist()
+
+    return [previousValue + ((nextValue - previousValue) * percentage) / 100.0
+            for previousValue, nextValue in zip(previousValues, nextValues)]
+
+
+def getChannels(obj, attrs, uiUnits=True) :
+    """
+    Reads the keyframes of every animated attribute, without going through a Maya command for each one.
+    Args:
+        obj: The object to read
+        attrs: The attributes to read
+        uiUnits: Whether to give the values in the same units getAttr uses, or the API's own units
+
+    Returns:
+        A list of (attrFull, curve, times, values) tuples, one for each attribute that has keyframes,
+        where curve is the MFnAnimCurve driving it. The times are sorted and in the scene's time unit.
+    """
+    selectionList = om.MSelectionList()
+    selectionList.add(obj)
+    node = om.MFnDependencyNode(selectionList.getDependNode(0))
+
+    channels = []
     for attr in attrs :
         # Construct the full name of the attribute with its object.
         attrFull = '%s.%s' % (obj, attr)
-        # Get the keyframes of the attribute on this object.
-        keyFrames = cmds.keyframe(attrFull, query=True)
 
-        # If there are no keyframes, then continue.
-        if not keyFrames :
+        try :
+            plug = node.findPlug(attr, False)
+        except RuntimeError :
             continue
 
-        # Without using list comprehension.
-        previousKeyFrames = []
-        for frame in keyFrames :
-            if frame < currentTime :
-                previousKeyFrames.append(frame)
-
-        # With using list comprehension.
-        laterKeyframes = [frame for frame in keyFrames if frame > currentTime]
+        # findAnimation follows the plug back to the animation curve driving it, if there is one.
+        curves = oma.MAnimUtil.findAnimation(plug)
 
-        # If there are no previous keyframes, and there are no later keyframes, then continue.
-        if not previousKeyFrames and not keyFrames :
+        # If there are no keyframes, then continue.
+        if not len(curves) :
             continue
 
-        if previousKeyFrames :
-            # Go through all the frames in the previousKeyFrames list and get the maximum value.
-            previousFrame = max(previousKeyFrames)
-        else :
-            previousFrame = None
-
-        nextFrame = min(laterKeyframes) if laterKeyframes else None
-
-        if not previousFrame or not nextFrame :
+        curve = oma.MFnAnimCurve(curves[0])
+        # Set driven keys are driven by another attribute instead of time, so there's nothing to tween.
+        if not curve.isTimeInput :
             continue
 
-        previousValue = cmds.getAttr(attrFull, time=previousFrame)
-        nextValue = cmds.getAttr(attrFull, time=nextFrame)
-
-        difference = nextValue - previousValue
-        weightedDifference = (difference * percentage) / 100.0
-        currentValue = previousValue + weightedDifference
+        times, values = readCurve(curve, uiUnits)
+        if times :
+            channels.append((attrFull, curve, times, values))
+
+    return channels
+
+
+def readCurve(curve, uiUnits=True) :
+    """
+    Reads every key of an animation curve.
+    Args:
+        curve: An MFnAnimCurve
+        uiUnits: Whether to convert the values to the same units getAttr uses
+
+    Returns:
+        A tuple of the list of key times and the list of key values.
+    """
+    timeUnit = om.MTime.uiUnit()
+
+    # The API gives us rotations in radians and distances in centimetres,
+    # so we convert them to whatever units the scene uses, which is what getAttr and setAttr use.
+    curveType = curve.animCurveType
+    if not uiUnits :
+        convert = lambda value : value
+    elif curveType == oma.MFnAnimCurve.kAnimCurveTA :
+        convert = lambda value : om.MAngle(value).asUnits(om.MAngle.uiUnit())
+    elif curveType == oma.MFnAnimCurve.kAnimCurveTL :
+        convert = lambda value : om.MDistance(value).asUnits(om.MDistance.uiUnit())
+    else :
+        convert = lambda value : value
+
+    times = [curve.input(index).asUnits(timeUnit) for index in range(curve.numKeys)]
+    values = [convert(curve.value(index)) for index in range(curve.numKeys)]
+
+    return times, values
+
+
+def findNeighbours(times, values, currentTime) :
+    """
+    Finds the values of the keys either side of a time.
+    Args:
+        times: The sorted key times
+        values: The key values, in the same order as the times
+        currentTime: The time to look either side of
+
+    Returns:
+        A tuple of the previous and next key values, or None if there isn't a key on both sides.
+    """
+    # bisect_left gives us the index of the first key at or after the current time,
+    # so the key before it is the last one before the current time.
+    previousIndex = bisect_left(times, currentTime) - 1
+    # bisect_right gives us the index of the first key after the current time.
+    nextIndex = bisect_right(times, currentTime)
+
+    if previousIndex < 0 or nextIndex >= len(times) :
+        return None
+
+    return values[previousIndex], values[nextIndex]
+
+
+def setKeys(newValues, time) :
+    """
+    Keys a value on every given attribute at the given time.
+    setKeyframe can only take one value per call, so we set each value first, and then key them all in one call.
+    It all goes in one undo chunk, so a single undo takes the whole tween back.
+    Args:
+        newValues: A dictionary of attrFull to the value to key
+        time: The time to key at. This should be the current time, since that's where setAttr puts the values.
+    """
+    if not newValues :
+        return
+
+    cmds.undoInfo(openChunk=True)
+    try :
+        for attrFull, value in newValues.items() :
+            cmds.setAttr(attrFull, value)
+
+        cmds.setKeyframe(list(newValues), time=time)
+    finally :
+        cmds.undoInfo(closeChunk=True)
+
+class KeyframeIndex( object ) :
+    """
+    Remembers the key times and values of every object we've tweened, so we don't read them from the scene again.
+    Finding the keys either side of a time is then just a binary search of the remembered times.
+
+    Maya tells us whenever an animation curve is edited, or connected to something, and we forget the keys of
+    only the objects those curves drive. We remember which objects each curve was read for, because a curve can
+    reach its object through other nodes, like a unitConversion or a character set, which findAnimation follows.
+    If a curve is connected to something we haven't read, we can't tell which object it ends up driving,
+    so we forget everything, since tweening with old keys would be much worse than reading them again.
+    Opening or making a new scene forgets everything too.
+
+    Example of use:
+        keyIndex.getChannels('pCube1', ['translateX'])
+    """
+
+    def __init__(self) :
+        # A dictionary of MObjectHandle hash code to the object's handle and its channels.
+        # We use handles rather than names so that renaming an object doesn't confuse us.
+        self.nodes = {}
+        # A dictionary of MObjectHandle hash code of each curve we've read, to the hash codes of the objects it drives.
+        self.curves = {}
+        self.callbacks = []
+
+    def getChannels(self, obj, attrs=None) :
+        """
+        Gives back the keys of an object's animated attributes, reading them from the scene only if we have to.
+        Args:
+            obj: The object to read
+            attrs: The attributes to read. Defaults to all the keyable attributes of the object.
+
+        Returns:
+            A list of (attrFull, times, values) tuples, one for each attribute that has keyframes.
+        """
+        selectionList = om.MSelectionList()
+        selectionList.add(obj)
+        handle = om.MObjectHandle(selectionList.getDependNode(0))
+
+        entry = self.nodes.get(handle.hashCode())
+        if entry is None or entry[0] != handle or not entry[0].isValid() :
+            self.install()
+
+            # We remember every keyable attribute, so the next tween can ask for any of them.
+            allAttrs = cmds.listAttr(obj, keyable=True) or []
+            channels = {}
+            for attrFull, curve, times, values in getChannels(obj, allAttrs) :
+                channels[attrFull[len(obj) + 1:]] = (times, values)
+                curveHash = om.MObjectHandle(curve.object()).hashCode()
+                self.curves.setdefault(curveHash, set()).add(handle.hashCode())
+
+            entry = (handle, allAttrs, channels)
+            self.nodes[handle.hashCode()] = entry
+
+        handle, allAttrs, channels = entry
+        return [('%s.%s' % (obj, attr),) + channels[attr] for attr in (attrs or allAttrs) if attr in channels]
+
+    def forget(self, node) :
+        """
+        Forgets the keys of a single object.
+        Args:
+            node: The MObject of the object
+        """
+        self.nodes.pop(om.MObjectHandle(node).hashCode(), None)
+
+    def forgetDriven(self, curve) :
+        """
+        Forgets the keys of every object an animation curve was read for.
+        A curve we've never read can't be behind any of the keys we remember, so there's nothing to forget for it.
+        Args:
+            curve: The MObject of the animation curve
+        """
+        for nodeHash in self.curves.pop(om.MObjectHandle(curve).hashCode(), ()) :
+            self.nodes.pop(nodeHash, None)
+
+    def clear(self, *args) :
+        """
+        Forgets everything.
+        """
+        self.nodes = {}
+        self.curves = {}
+
+    def onCurvesEdited(self, editedCurves, clientData) :
+        for curve in editedCurves :
+            self.forgetDriven(curve)
+
+    def onConnection(self, sourcePlug, destinationPlug, made, clientData) :
+        # A curve has been connected or disconnected, so an attribute has started or stopped being animated.
+        if not sourcePlug.node().hasFn(om.MFn.kAnimCurve) :
+            return
+
+        # If it goes straight into an object we've read, we only need to forget that one.
+        # Otherwise it could reach one of our objects through something like a unitConversion or a character set.
+        node = destinationPlug.node()
+        if om.MObjectHandle(node).hashCode() in self.nodes :
+            self.forget(node)
+        else :
+            self.clear()
+
+    def install(self) :
+        """
+        Starts listening to Maya for anything that changes the keys. This happens the first time we read any keys.
+        """
+        if self.callbacks :
+            return
+
+        self.callbacks = [
+            oma.MAnimMessage.addAnimCurveEditedCallback(self.onCurvesEdited),
+            om.MDGMessage.addConnectionCallback(self.onConnection),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeNew, self.clear),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeOpen, self.clear),
+        ]
+
+    def uninstall(self) :
+        """
+        Stops listening to Maya and forgets everything. Call this before reloading this module.
+        """
+        for callback in self.callbacks :
+            om.MMessage.removeCallback(callback)
+        self.callbacks = []
+        self.clear()
+
+
+# The one keyframe index that every tween shares.
+keyIndex = KeyframeIndex()
+
+
+class LiveTween( object ) :
+    """
+    Tweens while a slider is being dragged.
+    When the drag starts we find the keys either side of the current time once, and then every drag tick
+    only has to work out the new values and set them, which is fast enough to keep up with the mouse.
+    The keys themselves are only set when the slider is let go.
+    If the time changes, the selection changes or an animation curve is edited, the keys we found are forgotten,
+    and we find them again on the next tick.
+    """
+
+    def __init__(self, obj=None, attrs=None) :
+        """
+        Args:
+            obj: The object or list of objects to tween. Defaults to the selection at the time the drag starts.
+            attrs: The attributes to tween. Defaults to all the keyable attributes of each object.
+        """
+        self.obj = obj
+        self.attrs = attrs
+
+        # These are filled in when the drag starts.
+        self.attrFulls = None
+        self.previousValues = None
+        self.nextValues = None
+        self.time = None
+
+        self.scriptJobs = []
+        self.callbacks = []
+
+    def start(self) :
+        """
+        Finds the keys either side of the current time and starts watching for anything that would change them.
+        """
+        objs = getObjects(self.obj)
+
+        self.time = cmds.currentTime(query=True)
+        self.attrFulls, self.previousValues, self.nextValues = getNeighbours(objs, self.attrs, self.time)
+
+        if not self.scriptJobs :
+            self.scriptJobs = [cmds.scriptJob(event=[event, self.invalidate])
+                               for event in ("timeChanged", "SelectionChanged")]
+        if not self.callbacks :
+            self.callbacks = [oma.MAnimMessage.addAnimCurveEditedCallback(self.invalidate)]
+
+    def invalidate(self, *args) :
+        """
+        Forgets the keys we found, so we find them again on the next drag tick.
+        """
+        self.attrFulls = None
+        self.previousValues = None
+        self.nextValues = None
+
+    def drag(self, percentage) :
+        """
+        Sets the tweened values without keying them. This is what the slider's dragCommand calls.
+        """
+        if self.attrFulls is None :
+            self.start()
+
+        newValues = interpolate(self.previousValues, self.nextValues, percentage)
+
+        # We don't want every tick of the drag to be its own step in the undo queue,
+        # so we turn undo off while we set the values. The keys we set at the end can be undone.
+        cmds.undoInfo(stateWithoutFlush=False)
+        try :
+            for attrFull, value in zip(self.attrFulls, newValues) :
+                cmds.setAttr(attrFull, value)
+        finally :
+            cmds.undoInfo(stateWithoutFlush=True)
+
+    def commit(self, percentage) :
+        """
+        Keys the tweened values. This is what the slider's changeCommand calls when it's let go.
+        """
+        if self.attrFulls is None :
+            self.start()
+
+        newValues = interpolate(self.previousValues, self.nextValues, percentage)
+        setKeys(dict(zip(self.attrFulls, newValues)), self.time)
+
+    def stop(self, *args) :
+        """
+        Stops watching the scene. Call this when the window closes.
+        """
+        for job in self.scriptJobs :
+            if cmds.scriptJob(exists=job) :
+                cmds.scriptJob(kill=job, force=True)
+        self.scriptJobs = []
+
+        for callback in self.callbacks :
+            om.MMessage.removeCallback(callback)
+        self.callbacks = []
+
+        self.invalidate()
 
-        cmds.setKeyframe(attrFull, time=currentTime, value=currentValue)
 
 class TweenWindow( object ) :
 
@@ -74,6 +611,10 @@ class TweenWindow( object ) :
 
         cmds.window(self.windowName)
 
+        self.liveTween = LiveTween()
+        # When the window is closed, however that happens, stop the live tween from watching the scene.
+        cmds.scriptJob(uiDeleted=[self.windowName, self.liveTween.stop])
+
         self.buildUI()
 
         cmds.showWindow()
@@ -85,7 +626,9 @@ class TweenWindow( object ) :
 
         row = cmds.rowLayout(numberOfColumns=2)
 
-        self.slider = cmds.floatSlider(min=0, max=100, value=50, step=1, changeCommand=tween)
+        # The slider tweens live while it's dragged, and sets the keys when it's let go.
+        self.slider = cmds.floatSlider(min=0, max=100, value=50, step=1,
+                                       dragCommand=self.liveTween.drag, changeCommand=self.liveTween.commit)
 
         cmds.button(label="Reset", command=self.reset)
 
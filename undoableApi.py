@@ -0,0 +1,106 @@
+import os
+
+from maya import cmds
+# This is the Python 2.0 version of the Maya API.
+import maya.api.OpenMaya as om
+
+# Maya only hands plugins the Python 2.0 version of the API if they have this.
+maya_useNewAPI = True
+
+# The name of the plugin, which is the name of this file, and the command it adds.
+PLUGIN_NAME = "undoableApi"
+COMMAND_NAME = "undoableApiEdit"
+
+# The edits waiting for the command to pick them up. See run.
+pending = []
+
+
+class Edit(object):
+    """
+    A change made with the API, and how to take it back and make it again.
+    """
+
+    def __init__(self, doIt, undoIt, redoIt=None):
+        self.doIt = doIt
+        self.undoIt = undoIt
+        self.redoIt = redoIt or doIt
+        self.result = None
+
+
+def run(doIt, undoIt, redoIt=None):
+    """
+    Makes a change with the API inside a command, so that it goes on Maya's undo queue like any other command.
+    Changes made through the API on their own never reach the undo queue, so Ctrl+Z would skip straight past them.
+    The plugin that adds the command is loaded the first time this is used.
+
+    Example of use:
+        modifier = om.MDagModifier()
+        modifier.renameNode(mObject, "newName")
+        undoableApi.run(modifier.doIt, modifier.undoIt)
+
+    Args:
+        doIt: A function that makes the change
+        undoIt: A function that puts everything back the way doIt found it
+        redoIt: A function that makes the change again after it was undone. Defaults to doIt.
+
+    Returns:
+        Whatever doIt gave back
+    """
+    load()
+
+    edit = Edit(doIt, undoIt, redoIt)
+    pending.append(edit)
+    try:
+        getattr(cmds, COMMAND_NAME)()
+    finally:
+        # If the command never ran, we don't want it picking up this edit the next time.
+        if edit in pending:
+            pending.remove(edit)
+
+    return edit.result
+
+
+def load():
+    """
+    Loads this file as a plugin, if it isn't already.
+    """
+    if not cmds.pluginInfo(PLUGIN_NAME, query=True, loaded=True):
+        cmds.loadPlugin(os.path.splitext(os.path.abspath(__file__))[0] + ".py", quiet=True)
+
+
+class UndoableApiEdit(om.MPxCommand):
+    """
+    The command that run uses. It makes the change it's been handed and keeps it, so Maya can undo and redo it.
+    """
+
+    def __init__(self):
+        om.MPxCommand.__init__(self)
+        self.edit = None
+
+    @staticmethod
+    def creator():
+        return UndoableApiEdit()
+
+    def doIt(self, args):
+        # Maya can load this file as a plugin separately from the module our tools import,
+        # so we pick up the edit from the imported module rather than our own globals.
+        import undoableApi
+        self.edit = undoableApi.pending.pop()
+        self.edit.result = self.edit.doIt()
+
+    def undoIt(self):
+        self.edit.undoIt()
+
+    def redoIt(self):
+        self.edit.redoIt()
+
+    def isUndoable(self):
+        return True
+
+
+def initializePlugin(plugin):
+    om.MFnPlugin(plugin).registerCommand(COMMAND_NAME, UndoableApiEdit.creator)
+
+
+def uninitializePlugin(plugin):
+    om.MFnPlugin(plugin).deregisterCommand(COMMAND_NAME)